@@ -1,2 +0,0 @@
--- SQLite
-ALTER TABLE review_queue ADD COLUMN Original_File_Name TEXT;
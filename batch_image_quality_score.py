@@ -1,28 +1,116 @@
+import time
+_IMPORT_STARTED = time.perf_counter()
+
 import os
-import cv2
-import numpy as np
-from PIL import Image
-import pyiqa
-from tqdm import tqdm
-import sqlite3
+import sys
+import math
+import json
+import socket
+import argparse
+import subprocess
+import socketserver
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from importlib import metadata
+
+from utils.score_cache import ScoreCache, file_digest, DEFAULT_MAX_ENTRIES
+from utils import tracing
+from utils.repository import get_repository
+from utils.metric_registry import (METRICS, MetricStats, load_weights, active, measure_inputs, metric_scores,
+                                   weighted_qr, run_pixel_metrics, model, loaded_models)
+
+# The metrics and their QR weights come from config.yaml `scoring.weights` (see utils/metric_registry.py).
+# cv2 / numpy / PIL / torch / pyiqa / tqdm are imported inside the functions that
+# need them: an empty queue never pays for them, and pool workers only load the
+# decode libraries, never torch or the model.
 
 # --- DB path and table should match your main workflow ---
 DB_PATH = "data/review.db"
 TABLE_NAME = "review_queue"
 
-# --- Load the NIMA model (CPU for best compatibility) ---
-model = pyiqa.create_metric('nima').cpu()
+# --- Engine defaults (override with --workers / --batch-size) ---
+DEFAULT_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+DEFAULT_BATCH_SIZE = 16
+# Every image is scaled (aspect ratio kept) so its short edge is this size and centre-cropped
+# to a square before the pixel metrics (NIMA, ...), so a batch stacks into one tensor shared by
+# all of them. Scores differ slightly from the full-frame model(pil_img) of earlier versions;
+# 0 runs each full frame on its own as before (exact, much slower).
+# benchmarks.bench_nima_input prints the difference on real frames.
+NIMA_INPUT_SIZE = 299
+# Blur/brightness/contrast are measured on luma shrunk to this long edge (0 = full
+# resolution); see utils/quality_metrics.py. Part of the cache key. Off by default: the
+# blur normaliser (raw / 200) is calibrated on full-resolution Laplacian variance, which a
+# shrunk frame overstates, so blur_score would saturate. Only set it together with a blur
+# calibration that benchmarks.bench_quality_metrics confirms keeps QC_Status unchanged.
+METRICS_SIZE = 0
+# Rate blur by the sharpest tile instead of the whole frame (override with --tiled-blur).
+TILED_BLUR = False
+# Threads used to hash files for the score cache (I/O bound, hashlib releases the GIL).
+HASH_THREADS = 8
+# Near-duplicate frames (same Dup_Group, see utils/phash.py) share one NIMA run: the frame
+# with the best blur/brightness/contrast - i.e. the best QR, since NIMA is shared - is
+# scored in full and the others get its NIMA with their own metrics (Score_State 'Duplicate').
+# Override with --score-duplicates.
+SCORE_ONE_PER_GROUP = True
+# Cascade (--cascade): decode at reduced size (JPEG draft, with METRICS_SIZE set), compute the cheap metrics, and skip
+# the models for frames that would be Low even with every model metric at its ceiling - the
+# metric's true maximum (NIMA 10), so a skipped frame really could not have reached Average.
+# Skipped rows get Score_State 'Cascade-Skip', QC_Status Low, and that upper bound as QR;
+# --rescore-skipped scores them in full.
+# Lossy, opt-in (--cascade-learned-ceiling): cap NIMA at the CASCADE_QUANTILE of the NIMA scores
+# already in review_queue (CASCADE_NIMA_CEILING until CASCADE_MIN_HISTORY rows are scored). That
+# skips far more frames, but one scoring above the cap can be marked Low without being scored.
+CASCADE = False
+CASCADE_LEARNED_CEILING = False
+CASCADE_QUANTILE = 0.99
+CASCADE_MIN_HISTORY = 200
+CASCADE_NIMA_CEILING = 7.0
+# Measure the preview store's scoring-size copy (utils/preview_store.py) instead of decoding
+# the original; rows without one get a reduced-size (draft) decode. Override with --no-previews.
+# Only takes effect with 0 < METRICS_SIZE <= preview_store.SCORING_SIZE.
+USE_PREVIEWS = True
+
+# --- Long-lived scoring worker (opt-in, see ScoringWorker) ---
+WORKER_HOST = "127.0.0.1"
+WORKER_PORT = 8765
+WORKER_IDLE_TIMEOUT = 30 * 60  # seconds without requests before the worker exits
+WORKER_LOG = os.path.join("data", "scoring_worker.log")
+
+_pools = {}
+
+def load_models(weights):
+    """Load the weighted pyiqa models on first use and keep them for the life of the process."""
+    for name in active(weights, "pixels"):
+        model(name)
+
+def get_pool(workers):
+    pool = _pools.get(workers)
+    if pool is None:
+        pool = _pools[workers] = ProcessPoolExecutor(max_workers=workers)
+    return pool
 
+def shutdown_pools():
+    while _pools:
+        _, pool = _pools.popitem()
+        pool.shutdown()
+
+# Full-resolution reference versions of the metrics (one grey conversion each); the scorer
+# uses utils.quality_metrics.measure, and benchmarks/bench_quality_metrics.py compares the two.
 def calculate_blur(image):
+    import cv2
     gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
     lap_var = cv2.Laplacian(gray, cv2.CV_64F).var()
     return lap_var
 
 def calculate_brightness(image):
+    import cv2
+    import numpy as np
     gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
     return np.mean(gray)
 
 def calculate_contrast(image):
+    import cv2
+    import numpy as np
     gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
     return np.std(gray)
 
@@ -42,53 +130,581 @@ def qc_status(qr):
     else:
         return "Low"
 
-# --- Get images from the review_queue table ---
-conn = sqlite3.connect(DB_PATH)
-c = conn.cursor()
-c.execute(f"SELECT id, Path, Folder, File_Name FROM {TABLE_NAME} WHERE QR IS NULL OR QC_Status IS NULL")
-rows = c.fetchall()
-print(f"Scoring {len(rows)} images pending quality...")
+def compute_scores(raw, weights=None):
+    """Turn {metric: raw value} into the rounded score columns written to review_queue:
+    (nima, blur, brightness, contrast, QR, QC_Status, Extra_Scores)."""
+    weights = load_weights() if weights is None else weights
+    scores = metric_scores(raw)
+    quality_score = round(weighted_qr(scores, weights), 2)
+    columns = {METRICS[name].column: round(score, 2) for name, score in scores.items() if METRICS[name].column}
+    extra = {name: round(score, 2) for name, score in scores.items() if not METRICS[name].column}
+    return (
+        columns.get("nima_score"),
+        columns.get("blur_score"),
+        columns.get("brightness_score"),
+        columns.get("contrast_score"),
+        quality_score,
+        qc_status(quality_score),
+        json.dumps(extra, sort_keys=True) if extra else None,
+    )
+
+def measure_options(weights, tiled=TILED_BLUR, draft=False):
+    """What the decode workers compute: passed with every job so spawned workers agree with the parent."""
+    return {"tiled": tiled, "metrics": active(weights, "luma") + active(weights, "exif"),
+            "pixels": bool(active(weights, "pixels")), "draft": draft}
+
+def decode_and_measure(img_path, tiled=TILED_BLUR, metrics=(), pixels=True, draft=False):
+    """Decode the file once and share it between the luma/EXIF metrics and the pixel metrics.
+    Returns (pixels for the model batch or None, {metric: raw value}, {stage: seconds})."""
+    import cv2
+    import numpy as np
+    from PIL import Image
+    from utils.quality_metrics import LumaFrame
+    from utils.exif_index import read_exif
+    timings = {}
+    frame = exif = nima_pixels = None
+    luma = any(METRICS[name].input == "luma" for name in metrics)
+    if any(METRICS[name].input == "exif" for name in metrics):
+        exif = read_exif(img_path)
+    if pixels or luma:
+        started = time.perf_counter()
+        with Image.open(img_path) as im:
+            if draft and METRICS_SIZE:
+                # libjpeg decodes at 1/2-1/8 scale, still at least METRICS_SIZE on the long edge.
+                scale = METRICS_SIZE / max(im.size)
+                im.draft("RGB", (round(im.width * scale), round(im.height * scale)))
+            rgb = np.asarray(im.convert("RGB"))
+        timings["decode"] = time.perf_counter() - started
+        if luma:
+            started = time.perf_counter()
+            frame = LumaFrame(rgb, METRICS_SIZE, tiled)
+            timings["luma"] = time.perf_counter() - started
+        if pixels:
+            nima_pixels = fit_to_input(rgb, NIMA_INPUT_SIZE)
+    return nima_pixels, measure_inputs(metrics, frame, exif, timings), timings
+
+def fit_to_input(rgb, size=NIMA_INPUT_SIZE):
+    """Scale `rgb` so its short edge is `size`, keeping the aspect ratio, and centre-crop it to
+    size x size. size 0 returns the frame unchanged."""
+    import cv2
+    if not size:
+        return rgb
+    height, width = rgb.shape[:2]
+    scale = size / min(height, width)
+    resized = cv2.resize(rgb, (max(size, round(width * scale)), max(size, round(height * scale))),
+                         interpolation=cv2.INTER_AREA)
+    top, left = (resized.shape[0] - size) // 2, (resized.shape[1] - size) // 2
+    return resized[top:top + size, left:left + size]
 
-for row in tqdm(rows, desc="Scoring images"):
-    img_id, img_path, folder, fname = row
+def _measure_job(job, options):
+    # Runs inside the process pool; errors come back as strings so one bad file
+    # doesn't take the pool down.
+    img_id, img_path = job[:2]
+    source = job[2] if len(job) > 2 else img_path
     try:
-        pil_img = Image.open(img_path).convert("RGB")
-        nima_score = float(model(pil_img).item())
-        cv_img = cv2.imread(img_path)
-        blur = calculate_blur(cv_img)
-        brightness = calculate_brightness(cv_img)
-        contrast = calculate_contrast(cv_img)
-
-        blur_score = min(blur / 200.0, 1.0) * 10
-        brightness_score = max(0, min(1 - abs((brightness - 128) / 128), 1.0)) * 10
-        contrast_score = min(contrast / 64.0, 1.0) * 10
-
-        quality_score = (
-            nima_score * 0.6 +
-            blur_score * 0.2 +
-            brightness_score * 0.1 +
-            contrast_score * 0.1
-        )
-        quality_score = round(quality_score, 2)
-        qc = qc_status(quality_score)
-
-        # Update the DB with scores
-        c.execute(f"""
-            UPDATE {TABLE_NAME}
-            SET nima_score=?, blur_score=?, brightness_score=?, contrast_score=?, QR=?, QC_Status=?
-            WHERE id=?
-        """, (
-            round(nima_score, 2),
-            round(blur_score, 2),
-            round(brightness_score, 2),
-            round(contrast_score, 2),
-            quality_score,
-            qc,
-            img_id,
-        ))
-        conn.commit()
+        return img_id, img_path, decode_and_measure(source, **options), None
     except Exception as e:
-        print(f"❌ Error processing {img_path}: {e}")
+        return img_id, img_path, None, str(e)
+
+def iter_measurements(jobs, workers, options):
+    """Yield _measure_job results in input order, keeping at most a few jobs per worker in flight."""
+    if workers < 1:
+        for job in jobs:
+            yield _measure_job(job, options)
+        return
+    pool = get_pool(workers)
+    in_flight = deque()
+    for job in jobs:
+        in_flight.append(pool.submit(_measure_job, job, options))
+        if len(in_flight) >= workers * 4:
+            yield in_flight.popleft().result()
+    while in_flight:
+        yield in_flight.popleft().result()
+
+def model_cache_key(weights, tiled=TILED_BLUR, draft=False):
+    # Anything that changes a raw metric value for the same bytes must be part of the key
+    # (the weights don't: QR is recomputed from cached raw values). Read from package
+    # metadata so building the key doesn't import pyiqa.
+    key = f"{'+'.join(sorted(weights))}/metrics-{METRICS_SIZE}"
+    if active(weights, "pixels"):
+        key += f"/pyiqa-{metadata.version('pyiqa')}/input-{NIMA_INPUT_SIZE}-crop"
+    if draft:
+        key += "/draft"
+    return key + "/tiled" if tiled else key
+
+def _safe_digest(path):
+    try:
+        return file_digest(path)
+    except OSError:
+        return None
+
+def hash_files(paths):
+    with ThreadPoolExecutor(max_workers=HASH_THREADS) as pool:
+        return list(pool.map(_safe_digest, paths))
+
+def score_batch(repo, batch, weights, cache=None, digests=None, stats=None):
+    """Run the pixel metrics over one batch of measured images and persist the results.
+    Returns (scored, failed, {img_id: {pixel metric: raw value}})."""
+    names = active(weights, "pixels")
+    timings = {}
+    try:
+        with tracing.span("score.models", items=len(batch)):
+            results = run_pixel_metrics(names, [measured[0] for _, _, measured in batch], timings) if names else {}
+    except Exception as e:
+        for _, img_path, _ in batch:
+            print(f"❌ Error processing {img_path}: {e}")
+        repo.set_score_state([img_id for img_id, _, _ in batch], "Failed")
+        return 0, len(batch), {}
+    if stats is not None:
+        stats.add(timings, per=len(batch))
+    updates = []
+    cached = []
+    by_id = {}
+    for i, (img_id, _, measured) in enumerate(batch):
+        by_id[img_id] = {name: values[i] for name, values in results.items()}
+        raw = {**measured[1], **by_id[img_id]}
+        updates.append(compute_scores(raw, weights) + (img_id,))
+        if stats is not None:
+            stats.observe(metric_scores(raw), qc_status)
+        if digests is not None:
+            cached.append((digests.get(img_id), raw))
+    repo.set_scores(updates)
+    if cache is not None:
+        cache.put_many(cached)
+    return len(updates), 0, by_id
+
+def cascade_ceilings(repo, weights, nima_ceiling=None, learned=CASCADE_LEARNED_CEILING):
+    """{pixel metric: best raw value it can return} for the cascade's upper bound. An explicit
+    `nima_ceiling`, or `learned` (percentile of stored scores), lowers NIMA's below its maximum: lossy."""
+    ceilings = {name: METRICS[name].ceiling for name in active(weights, "pixels")}
+    if "nima" in ceilings:
+        if nima_ceiling:
+            ceilings["nima"] = nima_ceiling
+        elif learned:
+            ceilings["nima"] = repo.nima_quantile(CASCADE_QUANTILE, CASCADE_MIN_HISTORY) or CASCADE_NIMA_CEILING
+    return ceilings
+
+def cascade_scores(raw, weights, ceilings):
+    """Score columns for a frame that is Low even with its model metrics at `ceilings`, else None.
+    QR is that upper bound; the model metrics' own columns stay empty."""
+    bound = list(compute_scores({**raw, **ceilings}, weights))
+    if bound[5] != "Low":
+        return None
+    extra = json.loads(bound[6]) if bound[6] else {}
+    for name in ceilings:
+        extra.pop(name, None)
+    bound[0] = None
+    bound[6] = json.dumps(extra, sort_keys=True) if extra else None
+    return tuple(bound)
+
+def cheap_qr(raw, weights):
+    """QR without the pixel-metric terms; ranks frames that will share one model score."""
+    scores = metric_scores(raw)
+    return sum(scores[name] * weight for name, weight in weights.items() if name in scores)
+
+class GroupPlanner:
+    """Decides which measured rows go to the model when near-duplicates share a score.
+
+    Rows outside a group, or alone in their group, go through unchanged. For a group
+    that already has a model-scored frame, every row is a duplicate of it - unless the
+    row ranks above that frame (`known_rank`, its cheap QR), as happens when streaming
+    passes split a burst: then the group is re-elected among this run's rows. Otherwise
+    the group's members are held (only the best frame's pixels are kept) until all of
+    them have been measured, then the best one is released as the group's leader.
+    """
+
+    def __init__(self, rows, groups, known, weights, known_rank=None):
+        self.groups = groups
+        self.known = dict(known)   # group -> {pixel metric: raw value}
+        self.known_rank = dict(known_rank or {})   # group -> cheap QR of the frame `known` came from
+        self.weights = weights
+        self.remaining = {}
+        for img_id, _ in rows:
+            group = groups.get(img_id)
+            if group:
+                self.remaining[group] = self.remaining.get(group, 0) + 1
+        self.held = {}      # group -> {"best": (cheap, img_id, path, measured), "members": [(img_id, raw)]}
+        self.leaders = {}   # leader img_id -> group
+
+    def add(self, img_id, img_path, measured):
+        """Returns (rows for the model, duplicate score updates)."""
+        group = self.groups.get(img_id)
+        if group in self.known:
+            # QR is stored to 2 decimals; only a clearly better frame earns a model run of its own.
+            if cheap_qr(measured[1], self.weights) <= self.known_rank.get(group, math.inf) + 0.01:
+                self.remaining[group] -= 1
+                return [], [compute_scores({**measured[1], **self.known[group]}, self.weights) + (img_id,)]
+            del self.known[group]
+        if not group or (self.remaining[group] == 1 and group not in self.held):
+            return [(img_id, img_path, measured)], []
+        held = self.held.setdefault(group, {"best": None, "members": []})
+        held["members"].append((img_id, measured[1]))
+        cheap = cheap_qr(measured[1], self.weights)
+        if held["best"] is None or cheap > held["best"][0]:
+            held["best"] = (cheap, img_id, img_path, measured)
+        return self.skip(group), []
+
+    def skip(self, group):
+        """Count one member of `group` as handled (measured or failed); release its leader when all are."""
+        self.remaining[group] -= 1
+        if self.remaining[group] > 0 or group not in self.held:
+            return []
+        return self.release(group)
+
+    def release(self, group):
+        _, img_id, img_path, measured = self.held[group]["best"]
+        self.leaders[img_id] = group
+        return [(img_id, img_path, measured)]
+
+    def release_all(self):
+        """Leaders of groups still waiting on members (e.g. a member disappeared)."""
+        ready = []
+        for group, held in self.held.items():
+            if held["best"][1] not in self.leaders:
+                ready += self.release(group)
+        return ready
+
+    def duplicates_of(self, scored_by_id):
+        """Score updates for the held members of the leaders just scored."""
+        updates = []
+        for img_id, shared in scored_by_id.items():
+            group = self.leaders.get(img_id)
+            if group is None:
+                continue
+            self.known[group] = shared
+            for member_id, raw in self.held.pop(group)["members"]:
+                if member_id != img_id:
+                    updates.append(compute_scores({**raw, **shared}, self.weights) + (member_id,))
+        return updates
+
+def apply_cached(repo, rows, digests, cache, weights):
+    """Write scores for rows whose content is already in the cache; return the rows still to score."""
+    hits = cache.get_many([digests[img_id] for img_id, _ in rows])
+    updates, remaining = [], []
+    for img_id, img_path in rows:
+        values = hits.get(digests[img_id])
+        if values is None:
+            remaining.append((img_id, img_path))
+        else:
+            updates.append(compute_scores(values, weights) + (img_id,))
+    repo.set_scores(updates)
+    return len(updates), remaining
+
+def score_pending(workers=DEFAULT_WORKERS, batch_size=DEFAULT_BATCH_SIZE, db_path=DB_PATH,
+                  use_cache=True, cache_size=DEFAULT_MAX_ENTRIES, retry_failed=True, limit=None, progress=None,
+                  one_per_group=SCORE_ONE_PER_GROUP, tiled=TILED_BLUR, cascade=CASCADE, cascade_ceiling=None,
+                  rescore_skipped=False, use_previews=USE_PREVIEWS, cascade_learned=CASCADE_LEARNED_CEILING):
+    """Score pending rows (oldest first, at most `limit`). Streaming callers pass
+    retry_failed=False so a broken file isn't retried on every pass; a normal run
+    retries rows marked Failed. `progress(stage, done, total)` is called as images are measured."""
+    repo = get_repository(db_path)
+    weights = load_weights()
+    pixel_metrics = active(weights, "pixels")
+    cascade = cascade and bool(pixel_metrics)
+    rows = repo.unscored(retry_failed, limit, ("Cascade-Skip",) if rescore_skipped else ())
+    # Without a model metric there is nothing to share between near-duplicates.
+    groups = {img_id: group for img_id, _, group, _ in rows if group} if one_per_group and pixel_metrics else {}
+    hashes = {img_id: digest for img_id, _, _, digest in rows if digest}
+    rows = [(img_id, img_path) for img_id, img_path, _, _ in rows]
+    if not rows:
+        print("Nothing pending quality scoring.")
+        return 0, 0
+    total = len(rows)
+    print(f"Scoring {len(rows)} images pending quality (workers={workers}, batch size={batch_size})...")
+
+    # The store's copies are SCORING_SIZE; they can only stand in for a decode at that size or less.
+    use_previews = use_previews and 0 < METRICS_SIZE
+    # Draft decodes only happen with a working size; without one the pixels (and cache key) are unchanged.
+    draft = (cascade or use_previews) and METRICS_SIZE > 0
+    scored, failed = 0, 0
+    cache, digests = None, None
+    if use_cache:
+        cache = ScoreCache(model_cache_key(weights, tiled, draft), max_entries=cache_size)
+        unhashed = [r for r in rows if r[0] not in hashes]
+        digests = dict(zip([r[0] for r in unhashed], hash_files([r[1] for r in unhashed])))
+        digests.update(hashes)
+        scored, rows = apply_cached(repo, rows, digests, cache, weights)
+        if progress and scored:
+            progress("Cached", scored, total)
+        if scored:
+            print(f"Reused cached scores for {scored} images; {len(rows)} left to score.")
+
+    if rows:
+        from tqdm import tqdm
+        if pixel_metrics:
+            model_started = time.perf_counter()
+            warm = set(pixel_metrics) <= set(loaded_models())
+            load_models(weights)
+            print(f"Models {', '.join(pixel_metrics)} {'already loaded' if warm else 'loaded'} "
+                  f"in {time.perf_counter() - model_started:.2f}s")
+
+        batch = []
+        decode_failed = []
+        duplicates = []
+        skipped = []
+        stats = MetricStats(weights)
+        ceilings = cascade_ceilings(repo, weights, cascade_ceiling, cascade_learned) if cascade else None
+        if ceilings:
+            lossy = any(value != METRICS[name].ceiling for name, value in ceilings.items())
+            print("Cascade: models skipped for frames that stay Low with "
+                  + ", ".join(f"{name} at {value:.2f}" for name, value in ceilings.items())
+                  + (" (below the metric's maximum: lossy)" if lossy else ""))
+        # Scores stored in the table are only enough to reuse when NIMA is the sole model metric.
+        known, known_rank = {}, {}
+        if groups and pixel_metrics == ["nima"]:
+            for group, (nima, qr) in repo.group_nima(groups.values()).items():
+                known[group] = {"nima": nima}
+                known_rank[group] = (qr or 0.0) - weights["nima"] * METRICS["nima"].score(nima)
+        planner = GroupPlanner(rows, groups, known, weights, known_rank)
+        counts = {"skipped": 0}
+
+        def flush():
+            # Decode failures, duplicates and cascade skips ride along with the next batch's
+            # scores: one commit per batch.
+            with repo.batch():
+                ok, bad, scored_by_id = score_batch(repo, batch, weights, cache, digests, stats) if batch else (0, 0, {})
+                with tracing.span("score.write", items=len(batch) + len(duplicates) + len(skipped) + len(decode_failed)):
+                    duplicates.extend(planner.duplicates_of(scored_by_id))
+                    repo.set_scores(duplicates, "Duplicate")
+                    repo.set_scores(skipped, "Cascade-Skip")
+                    repo.set_score_state(decode_failed, "Failed")
+            ok += len(duplicates) + len(skipped)
+            counts["skipped"] += len(skipped)
+            decode_failed.clear()
+            duplicates.clear()
+            skipped.clear()
+            return ok, bad
+
+        with tqdm(total=len(rows), desc="Scoring images") as bar:
+            options = measure_options(weights, tiled, draft)
+            jobs = rows
+            if use_previews:
+                from utils.preview_store import lookup, SCORING_SIZE
+                if METRICS_SIZE <= SCORING_SIZE:
+                    jobs = [(img_id, img_path, lookup(hashes.get(img_id), "scoring") or img_path)
+                            for img_id, img_path in rows]
+            sources = {job[0]: job[-1] for job in jobs}
+            for img_id, img_path, measured, error in iter_measurements(jobs, workers, options):
+                bar.update(1)
+                if progress:
+                    progress("Scoring", scored + failed + len(batch) + 1, total)
+                if error:
+                    print(f"❌ Error processing {img_path}: {error}")
+                    decode_failed.append(img_id)
+                    failed += 1
+                    if img_id in groups:
+                        batch.extend(planner.skip(groups[img_id]))
+                else:
+                    stats.add(measured[2])
+                    # Timed in the decode workers; recorded here so they land in this run.
+                    timings = measured[2]
+                    tracing.record("score.decode", timings.get("decode", 0.0), file=img_path,
+                                   bytes_in=tracing.file_size(sources[img_id]))
+                    tracing.record("score.measure", sum(s for k, s in timings.items() if k != "decode"),
+                                   file=img_path)
+                    low = cascade_scores(measured[1], weights, ceilings) if ceilings else None
+                    if low:
+                        skipped.append(low + (img_id,))
+                        if img_id in groups:
+                            batch.extend(planner.skip(groups[img_id]))
+                    else:
+                        to_model, dups = planner.add(img_id, img_path, measured)
+                        batch.extend(to_model)
+                        duplicates.extend(dups)
+                if len(batch) >= batch_size:
+                    ok, bad = flush()
+                    scored, failed = scored + ok, failed + bad
+                    batch = []
+            batch.extend(planner.release_all())
+            while batch or decode_failed or duplicates or skipped:
+                ok, bad = flush()
+                scored, failed = scored + ok, failed + bad
+                batch = planner.release_all()
+        if ceilings:
+            print(f"Cascade: {counts['skipped']} of {len(rows)} frames skipped the models.")
+        if stats.samples:
+            print("Per-metric latency (ms per image):")
+            print(stats.summary())
+            stats.write()
+        tracing.flush()
+
+    if cache is not None:
+        cache.close()
+        print(cache.summary())
+    return scored, failed
+
+# --- Long-lived worker: one JSON request/response line per TCP connection ---
+
+class _WorkerHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        try:
+            request = json.loads(line)
+            response = self.server.dispatch(request)
+        except Exception as e:
+            response = {"ok": False, "error": str(e)}
+        self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+
+class _WorkerServer(socketserver.TCPServer):
+    allow_reuse_address = True
+
+    def __init__(self, address):
+        super().__init__(address, _WorkerHandler)
+        self.started = time.time()
+        self.last_request = time.time()
+        self.stopping = False
+
+    def dispatch(self, request):
+        self.last_request = time.time()
+        cmd = request.get("cmd")
+        if cmd == "ping":
+            return {"ok": True, "model_loaded": bool(loaded_models()),
+                    "uptime": round(time.time() - self.started, 1)}
+        if cmd == "score":
+            tracing.set_run(request.get("run_id"))
+            started = time.perf_counter()
+            warm = bool(loaded_models())
+            scored, failed = score_pending(
+                request.get("workers", DEFAULT_WORKERS),
+                request.get("batch_size", DEFAULT_BATCH_SIZE),
+                request.get("db", DB_PATH),
+                use_cache=request.get("use_cache", True),
+                cache_size=request.get("cache_size", DEFAULT_MAX_ENTRIES),
+                retry_failed=request.get("retry_failed", True),
+                limit=request.get("limit"),
+                one_per_group=request.get("one_per_group", SCORE_ONE_PER_GROUP),
+                tiled=request.get("tiled", TILED_BLUR),
+                cascade=request.get("cascade", CASCADE),
+                cascade_ceiling=request.get("cascade_ceiling"),
+                cascade_learned=request.get("cascade_learned", CASCADE_LEARNED_CEILING),
+                rescore_skipped=request.get("rescore_skipped", False),
+                use_previews=request.get("use_previews", USE_PREVIEWS),
+            )
+            return {"ok": True, "scored": scored, "failed": failed, "warm": warm,
+                    "seconds": round(time.perf_counter() - started, 3)}
+        if cmd == "shutdown":
+            self.stopping = True
+            return {"ok": True}
+        return {"ok": False, "error": f"unknown command {cmd!r}"}
+
+def serve(host=WORKER_HOST, port=WORKER_PORT, idle_timeout=WORKER_IDLE_TIMEOUT, preload=True):
+    with _WorkerServer((host, port)) as server:
+        print(f"Scoring worker listening on {host}:{port} (idle timeout {idle_timeout}s)", flush=True)
+        if preload:
+            load_models(load_weights())
+            print(f"Models preloaded: {', '.join(loaded_models()) or 'none (no pixel metric weighted)'}.", flush=True)
+        server.timeout = 5
+        while not server.stopping and time.time() - server.last_request < idle_timeout:
+            server.handle_request()
+    shutdown_pools()
+    print("Scoring worker stopped.", flush=True)
+
+class ScoringWorker:
+    """Client for a long-lived `--serve` process, so batches skip interpreter and model start-up."""
+
+    def __init__(self, host=WORKER_HOST, port=WORKER_PORT):
+        self.host = host
+        self.port = port
+
+    def request(self, cmd, timeout=None, **params):
+        params["cmd"] = cmd
+        with socket.create_connection((self.host, self.port), timeout=timeout) as sock:
+            sock.sendall((json.dumps(params) + "\n").encode("utf-8"))
+            with sock.makefile("r", encoding="utf-8") as reader:
+                response = json.loads(reader.readline())
+        if not response.get("ok"):
+            raise RuntimeError(f"Scoring worker error: {response.get('error')}")
+        return response
+
+    def is_running(self):
+        try:
+            self.request("ping", timeout=2)
+            return True
+        except (OSError, ValueError, RuntimeError):
+            return False
+
+    def start(self, wait=120):
+        """Spawn a detached worker (if none is listening) and wait until it answers."""
+        if self.is_running():
+            return
+        here = os.path.dirname(os.path.abspath(__file__))
+        os.makedirs(os.path.join(here, os.path.dirname(WORKER_LOG)), exist_ok=True)
+        log = open(os.path.join(here, WORKER_LOG), "a", encoding="utf-8")
+        kwargs = {"cwd": here, "stdout": log, "stderr": subprocess.STDOUT, "stdin": subprocess.DEVNULL}
+        if os.name == "nt":
+            kwargs["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP | subprocess.DETACHED_PROCESS
+        else:
+            kwargs["start_new_session"] = True
+        subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve",
+                          "--host", self.host, "--port", str(self.port)], **kwargs)
+        log.close()
+        deadline = time.time() + wait
+        while time.time() < deadline:
+            if self.is_running():
+                return
+            time.sleep(0.5)
+        raise RuntimeError(f"Scoring worker did not start within {wait}s (see {WORKER_LOG})")
+
+    def score(self, **params):
+        if "db" in params:
+            params["db"] = os.path.abspath(params["db"])
+        else:
+            params["db"] = os.path.abspath(DB_PATH)
+        params.setdefault("run_id", tracing.run_id())  # the worker outlives runs; tell it which one this is
+        return self.request("score", **params)
+
+    def shutdown(self):
+        self.request("shutdown", timeout=10)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Score pending review_queue images (the metrics weighted in config.yaml).")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="decode/metric processes (0 = run in this process)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="images per model forward pass and per DB transaction")
+    parser.add_argument("--db", default=DB_PATH, help="path to review.db")
+    parser.add_argument("--no-cache", action="store_true", help="ignore the content-hash score cache")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_MAX_ENTRIES,
+                        help="maximum cached entries before least-recently-used eviction")
+    parser.add_argument("--score-duplicates", action="store_true",
+                        help="run NIMA on every near-duplicate frame, not just the best of each group")
+    parser.add_argument("--tiled-blur", action="store_true", default=TILED_BLUR,
+                        help="rate blur by the sharpest tile (subject on a soft background) instead of the whole frame")
+    parser.add_argument("--cascade", action="store_true", default=CASCADE,
+                        help="skip the models for frames the cheap metrics already put in Low")
+    parser.add_argument("--cascade-ceiling", type=float,
+                        help="NIMA upper bound for --cascade (default: 10, its maximum); lower values are lossy")
+    parser.add_argument("--cascade-learned-ceiling", action="store_true", default=CASCADE_LEARNED_CEILING,
+                        help="lossy: cap NIMA at the 99th percentile of scored rows, so --cascade skips more frames")
+    parser.add_argument("--rescore-skipped", action="store_true",
+                        help="also score rows an earlier --cascade run skipped (Score_State 'Cascade-Skip')")
+    parser.add_argument("--no-previews", action="store_true",
+                        help="decode the originals in full instead of using the preview store's scoring copies")
+    parser.add_argument("--serve", action="store_true",
+                        help="run as a long-lived scoring worker instead of scoring once")
+    parser.add_argument("--host", default=WORKER_HOST)
+    parser.add_argument("--port", type=int, default=WORKER_PORT)
+    parser.add_argument("--idle-timeout", type=int, default=WORKER_IDLE_TIMEOUT)
+    args = parser.parse_args(argv)
+    if args.batch_size < 1:
+        parser.error("--batch-size must be at least 1")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.serve:
+        serve(args.host, args.port, args.idle_timeout)
+        return
+    print(f"Startup took {time.perf_counter() - _IMPORT_STARTED:.2f}s")
+    scored, failed = score_pending(args.workers, args.batch_size, args.db,
+                                   use_cache=not args.no_cache, cache_size=args.cache_size,
+                                   one_per_group=not args.score_duplicates, tiled=args.tiled_blur,
+                                   cascade=args.cascade, cascade_ceiling=args.cascade_ceiling,
+                                   rescore_skipped=args.rescore_skipped, use_previews=not args.no_previews,
+                                   cascade_learned=args.cascade_learned_ceiling)
+    shutdown_pools()
+    print(f"\n✅ All done! Scored {scored}, failed {failed}. Scores written to your review queue.")
+    print(f"Total run time {time.perf_counter() - _IMPORT_STARTED:.2f}s")
 
-conn.close()
-print("\n✅ All done! Scores written to your review queue.")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""NIMA on the scorer's batched input vs the full-frame model(pil_img) of earlier versions.
+
+    python -m benchmarks.bench_nima_input --images A.jpg B.jpg ... [--repeat 1]
+
+For each frame:
+  - the full frame through run_pixel_metrics (NIMA_INPUT_SIZE = 0) must reproduce model(pil_img);
+  - at the scorer's NIMA_INPUT_SIZE (short edge scaled, centre-cropped) the NIMA and QR
+    differences, and any QC_Status change, are printed with the time per image.
+Needs real photos (NIMA rates content) and torch/pyiqa.
+"""
+import time
+import argparse
+
+import numpy as np
+from PIL import Image
+
+from batch_image_quality_score import compute_scores, fit_to_input, METRICS_SIZE, NIMA_INPUT_SIZE
+from utils.metric_registry import DEFAULT_WEIGHTS, model, run_pixel_metrics
+from utils.quality_metrics import measure
+
+def timed(fn, repeat):
+    best, value = None, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        value = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, value
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", nargs="+", required=True)
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    flips, deltas = 0, []
+    for path in args.images:
+        with Image.open(path) as im:
+            pil_img = im.convert("RGB")
+        rgb = np.asarray(pil_img)
+        old_t, old = timed(lambda: float(model("nima")(pil_img).item()), args.repeat)
+        full = run_pixel_metrics(["nima"], [fit_to_input(rgb, 0)])["nima"][0]
+        new_t, new = timed(lambda: run_pixel_metrics(["nima"], [fit_to_input(rgb, NIMA_INPUT_SIZE)])["nima"][0],
+                           args.repeat)
+        assert abs(full - old) < 1e-4, f"{path}: full-frame NIMA {full} != model(pil_img) {old}"
+
+        blur, brightness, contrast = measure(rgb, METRICS_SIZE)
+        others = {"blur": blur, "brightness": brightness, "contrast": contrast}
+        base = compute_scores({"nima": old, **others}, DEFAULT_WEIGHTS)
+        used = compute_scores({"nima": new, **others}, DEFAULT_WEIGHTS)
+        flipped = used[5] != base[5]
+        flips += flipped
+        deltas.append(new - old)
+        print(f"{path} ({rgb.shape[1]}x{rgb.shape[0]})")
+        print(f"  model(pil_img)          NIMA {old:6.3f}  {old_t * 1000:8.1f} ms")
+        print(f"  {NIMA_INPUT_SIZE} px centre crop    NIMA {new:6.3f}  {new_t * 1000:8.1f} ms  "
+              f"(NIMA {new - old:+.3f}, QR {used[4] - base[4]:+.3f}, QC {base[5]} -> {used[5]}"
+              f"{', changed' if flipped else ''})")
+    print(f"At NIMA_INPUT_SIZE={NIMA_INPUT_SIZE}: mean NIMA change {np.mean(deltas):+.3f}, "
+          f"max |change| {np.max(np.abs(deltas)):.3f}; QC_Status changed for {flips} of {len(deltas)} frames.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Old per-metric OpenCV functions vs utils.quality_metrics.measure on 24MP / 45MP frames.
+
+    python -m benchmarks.bench_quality_metrics [--repeat 3] [--images A.jpg B.jpg ...]
+
+Without --images the frames are synthetic: a soft background with a sharp, textured
+subject in the middle (the bokeh case tiled mode is for). Each frame is checked:
+  - measure(max_side=0) must reproduce the old values (same metric, one luma pass);
+  - at the scorer's METRICS_SIZE, QC_Status must be the same as with the old values;
+  - at WORKING_SIZE (and tiled), the score and QC_Status differences are printed, to see
+    what a working size would change before turning METRICS_SIZE on.
+"""
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+from batch_image_quality_score import (calculate_blur, calculate_brightness, calculate_contrast,
+                                       compute_scores, METRICS_SIZE)
+from utils.metric_registry import DEFAULT_WEIGHTS
+from utils.quality_metrics import measure, WORKING_SIZE
+
+SIZES = {"24MP": (6000, 4000), "45MP": (8192, 5464)}
+NIMA_PLACEHOLDER = 5.0   # the NIMA term is the same on both sides; any value will do
+
+def synthetic_frame(width, height, seed=0):
+    rng = np.random.default_rng(seed)
+    background = rng.integers(40, 200, size=(height // 200, width // 200, 3), dtype=np.uint8)
+    frame = cv2.GaussianBlur(cv2.resize(background, (width, height), interpolation=cv2.INTER_CUBIC), (0, 0), 8)
+    h, w = height // 4, width // 4
+    subject = rng.integers(0, 256, size=(h // 4, w // 4, 3), dtype=np.uint8)
+    frame[height // 2 - h // 2:height // 2 - h // 2 + h, width // 2 - w // 2:width // 2 - w // 2 + w] = \
+        cv2.resize(subject, (w, h), interpolation=cv2.INTER_NEAREST)
+    return frame
+
+def load_frame(path):
+    from PIL import Image
+    with Image.open(path) as im:
+        return np.asarray(im.convert("RGB"))
+
+def old_measure(rgb):
+    bgr = cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+    return float(calculate_blur(bgr)), float(calculate_brightness(bgr)), float(calculate_contrast(bgr))
+
+def as_raw(values):
+    blur, brightness, contrast = values
+    return {"nima": NIMA_PLACEHOLDER, "blur": blur, "brightness": brightness, "contrast": contrast}
+
+def timed(fn, repeat):
+    best, value = None, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        value = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, value
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--images", nargs="+", help="real frames to use instead of the synthetic ones")
+    args = parser.parse_args()
+
+    if args.images:
+        frames = [(path, load_frame(path)) for path in args.images]
+    else:
+        frames = [(label, synthetic_frame(w, h, seed)) for seed, (label, (w, h)) in enumerate(SIZES.items())]
+
+    flips = 0
+    for label, rgb in frames:
+        old_t, old = timed(lambda: old_measure(rgb), args.repeat)
+        full_t, full = timed(lambda: measure(rgb, max_side=0), args.repeat)
+        small_t, small = timed(lambda: measure(rgb, WORKING_SIZE), args.repeat)
+        tiled_t, tiled = timed(lambda: measure(rgb, WORKING_SIZE, tiled=True), args.repeat)
+        assert np.allclose(full, old, rtol=1e-6), f"{label}: full-resolution measure {full} != old {old}"
+        base = compute_scores(as_raw(old), DEFAULT_WEIGHTS)
+        used = compute_scores(as_raw(measure(rgb, METRICS_SIZE)), DEFAULT_WEIGHTS)
+        assert used[5] == base[5], (f"{label}: QC_Status {base[5]} -> {used[5]} at METRICS_SIZE={METRICS_SIZE}; "
+                                    f"recalibrate the blur score for that size first")
+
+        print(f"{label} ({rgb.shape[1]}x{rgb.shape[0]})")
+        print(f"  old 3x cvtColor + CV_64F   {old_t * 1000:8.1f} ms")
+        print(f"  measure full resolution    {full_t * 1000:8.1f} ms  (matches old)")
+        print(f"  measure at {WORKING_SIZE:<5}px         {small_t * 1000:8.1f} ms  ({old_t / small_t:.1f}x)")
+        print(f"  measure at {WORKING_SIZE:<5}px, tiled  {tiled_t * 1000:8.1f} ms")
+        for name, values in (("working size", small), ("tiled", tiled)):
+            scores = compute_scores(as_raw(values), DEFAULT_WEIGHTS)
+            deltas = ", ".join(f"{field} {new - ref:+.2f}" for field, new, ref in
+                               zip(("blur", "brightness", "contrast", "QR"), scores[1:5], base[1:5]))
+            flipped = scores[5] != base[5]
+            flips += flipped
+            print(f"  {name:<13} score deltas: {deltas}  QC {base[5]} -> {scores[5]}{'  (changed)' if flipped else ''}")
+    print(f"QC_Status unchanged at METRICS_SIZE={METRICS_SIZE}; at {WORKING_SIZE} px it would change for "
+          f"{flips} of {len(frames) * 2} measurements.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Memory/time of review_queue rows as dicts (the old dict(zip(cols, row))) vs slotted ReviewRow.
+
+    python -m benchmarks.bench_row_model [--rows 100000]
+
+Rows are synthetic tuples shaped like SELECT results, so no database is needed.
+"""
+import gc
+import time
+import argparse
+import tracemalloc
+
+from utils.repository import COLUMNS, PHOTO_FIELDS, ReviewRow
+
+INT_FIELDS = {"Width", "Height", "ISO", "Focal_length"}
+
+def synthetic_rows(n):
+    for i in range(n):
+        yield (
+            i + 1, "birds", f"Bird_{i:06d}.jpg", f"C:/incoming/IMG_{i:06d}.jpg", "", "2024:05:17 08:12:45",
+            "Canon EOS R5", "RF100-500mm F4.5-7.1 L IS USM", 8192, 5464, "1/2000", "f/7.1", 800, 500,
+            "bird, wildlife, nature", "A bird on a branch", "Amsterdam", "Bird",
+            5.1 + i % 3, 120.5, 118.2, 52.3, 6.2, "Average", "Pending", f"IMG_{i:06d}.jpg", "Scored",
+            f"{i:016x}", f"{i:016x}", None, None, f"{i:064x}",
+        )
+
+def dict_photo_params(record):
+    # What db_uploader.photo_params did field by field.
+    return tuple(int(record[f]) if f in INT_FIELDS else record[f] for f in PHOTO_FIELDS)
+
+def measure(label, build, convert, raw):
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    rows = build(raw)
+    built = time.perf_counter() - started
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    started = time.perf_counter()
+    params = [convert(r) for r in rows]
+    converted = time.perf_counter() - started
+    print(f"{label:<10} {size / 1_048_576:8.1f} MB  build {built * 1000:7.1f} ms  "
+          f"params {converted * 1000:7.1f} ms")
+    return params
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    raw = list(synthetic_rows(args.rows))
+    print(f"{args.rows} rows x {len(COLUMNS)} columns (memory is the row objects only)")
+    as_dicts = measure("dict", lambda rs: [dict(zip(COLUMNS, r)) for r in rs], dict_photo_params, raw)
+    as_rows = measure("ReviewRow", lambda rs: [ReviewRow(*r) for r in rs], ReviewRow.to_photo_params, raw)
+    assert as_dicts == as_rows, "ReviewRow.to_photo_params disagrees with the dict version"
+
+if __name__ == "__main__":
+    main()
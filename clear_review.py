@@ -1,10 +1,7 @@
-import sqlite3
-
-DB_PATH = "data/review.db"
-TABLE = "review_queue"
+from utils.db_schema import DB_PATH, TABLE_NAME as TABLE, connect
 
 def clear_table():
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect(DB_PATH)
     c = conn.cursor()
     c.execute(f"DELETE FROM {TABLE};")
     conn.commit()
@@ -1,10 +1,19 @@
 import os
-import sqlite3
-import mysql.connector
-from ftplib import FTP
+import argparse
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
 from datetime import datetime
 import json
 
+from utils.db_schema import connect
+from utils.ftp_pool import FTPPool
+from utils.repository import get_repository, ReviewRow, PHOTO_FIELDS
+from utils.upload_journal import UploadJournal
+from utils.score_cache import file_digest
+from utils.tracing import span
+
 # Config
 DB_PATH = "data/review.db"
 LOCAL_MIRROR_DB = "data/photos_info.db"
@@ -29,161 +38,332 @@ FTP_CONFIG = {
     "user": "your_ftp_user",
     "passwd": "your_ftp_password"
 }
+# Parallel FTP sessions used for image/thumb transfers.
+FTP_SESSIONS = 4
+# Rows per remote upsert/commit (override with --chunk-size).
+REMOTE_CHUNK_SIZE = 100
+
+UNIQUE_KEY = ("Folder", "File_Name")
+UNIQUE_INDEX = "uq_photos_folder_file"
+# Extra mirror-only columns: digests used by delta sync to tell what changed since the last
+# publish, and the perceptual hash ingest checks new frames against (utils/phash.py).
+MIRROR_DIGEST_FIELDS = ["meta_digest", "file_hash", "thumb_hash", "dhash"]
+# Only send what changed since the mirror last saw a row (override with --full).
+DELTA_SYNC = True
+
+FOLDER_MAP_FILE = "data/folder_map.json"
+
+@lru_cache(maxsize=1)
+def load_folder_map():
+    # Read on first use, not at import, so importing this module has no side effects.
+    with open(FOLDER_MAP_FILE, encoding="utf-8") as f:
+        return json.load(f)
+
+@dataclass(slots=True)
+class UploadRecord(ReviewRow):
+    """An Approved row plus what the uploader works out for it. Slotted like ReviewRow, and built
+    straight from the query result (repo.approved(UploadRecord))."""
+    local_img: str = None
+    local_thumb: str = None
+    remote_img_dir: str = None
+    remote_thumb_dir: str = None
+    journal: dict = None
+    img_hash: str = None
+    thumb_hash: str = None
+    meta_digest: str = None
+    remote_mode: str = None
+    skip_steps: set = None
+
+    def to_mirror_params(self):
+        return self.to_photo_params() + (self.meta_digest, self.img_hash, self.thumb_hash, self.dhash)
+
+def meta_digest(record):
+    return hashlib.sha256(json.dumps(record.to_photo_params(), default=str).encode("utf-8")).hexdigest()
+
+def upsert_sql(dialect, fields=PHOTO_FIELDS):
+    """INSERT that updates the existing row with the same (Folder, File_Name) instead of duplicating it."""
+    cols = ", ".join(fields)
+    updated = [f for f in fields if f not in UNIQUE_KEY]
+    if dialect == "mysql":
+        marks = ", ".join(["%s"] * len(fields))
+        changes = ", ".join(f"{f}=VALUES({f})" for f in updated)
+        return f"INSERT INTO {TABLE_NAME} ({cols}) VALUES ({marks}) ON DUPLICATE KEY UPDATE {changes}"
+    if dialect == "sqlite":
+        marks = ", ".join(["?"] * len(fields))
+        changes = ", ".join(f"{f}=excluded.{f}" for f in updated)
+        return (f"INSERT INTO {TABLE_NAME} ({cols}) VALUES ({marks}) "
+                f"ON CONFLICT({', '.join(UNIQUE_KEY)}) DO UPDATE SET {changes}")
+    raise ValueError(f"Unknown dialect: {dialect}")
+
+def update_sql(dialect):
+    """Metadata-only UPDATE; parameters are record.to_update_params()."""
+    mark = "%s" if dialect == "mysql" else "?"
+    changes = ", ".join(f"{f}={mark}" for f in PHOTO_FIELDS if f not in UNIQUE_KEY)
+    return f"UPDATE {TABLE_NAME} SET {changes} WHERE Folder={mark} AND File_Name={mark}"
 
-with open("data/folder_map.json", encoding="utf-8") as f:
-    folder_map = json.load(f)
+def ensure_mirror_digest_columns(mirror_conn):
+    cols = [row[1] for row in mirror_conn.execute(f"PRAGMA table_info({TABLE_NAME})")]
+    with mirror_conn:
+        for field in MIRROR_DIGEST_FIELDS:
+            if field not in cols:
+                mirror_conn.execute(f"ALTER TABLE {TABLE_NAME} ADD COLUMN {field} TEXT")
 
-def mkdir_p(ftp, remote_dir):
-    ftp.cwd("/")
-    for part in remote_dir.strip("/").split("/"):
-        if not part:
-            continue
+def _safe_digest(path):
+    try:
+        return file_digest(path)
+    except OSError:
+        return None
+
+def plan_delta(records, mirror_conn, delta):
+    """Hash every record and decide what it needs: record.remote_mode is "upsert", "update"
+    (metadata only) or "none", and record.skip_steps lists FTP transfers that can be skipped."""
+    with ThreadPoolExecutor(max_workers=FTP_SESSIONS * 2) as executor:
+        img_hashes = list(executor.map(_safe_digest, [r.local_img for r in records]))
+        thumb_hashes = list(executor.map(_safe_digest, [r.local_thumb for r in records]))
+    counts = {"upsert": 0, "update": 0, "none": 0}
+    for record, img_hash, thumb_hash in zip(records, img_hashes, thumb_hashes):
+        record.img_hash, record.thumb_hash = img_hash, thumb_hash
         try:
-            ftp.cwd(part)
-        except:
-            ftp.mkd(part)
-            ftp.cwd(part)
-
-def upload():
-    conn_local = sqlite3.connect(DB_PATH)
-    c = conn_local.cursor()
-    c.execute(f"SELECT * FROM {REVIEW_QUEUE} WHERE Review_Status='Approved'")
-    rows = c.fetchall()
-    cols = [d[0] for d in c.description]
-
-    if not rows:
-        print("Nothing approved for upload.")
+            record.meta_digest = meta_digest(record)
+        except (TypeError, ValueError):
+            record.meta_digest = None  # bad metadata; the upsert will report it
+        record.remote_mode, record.skip_steps = "upsert", set()
+        if delta:
+            known = mirror_conn.execute(
+                f"SELECT meta_digest, file_hash, thumb_hash FROM {TABLE_NAME} WHERE Folder=? AND File_Name=?",
+                (record.Folder, record.File_Name),
+            ).fetchone()
+            if known:
+                if img_hash and known[1] == img_hash:
+                    record.skip_steps.add("image_stor")
+                if thumb_hash and known[2] == thumb_hash:
+                    record.skip_steps.add("thumb_stor")
+                if len(record.skip_steps) == 2:
+                    same_meta = record.meta_digest and known[0] == record.meta_digest
+                    record.remote_mode = "none" if same_meta else "update"
+        counts[record.remote_mode] += 1
+    return counts
+
+def ensure_unique_key(conn, dialect):
+    """Make (Folder, File_Name) unique so upserts are idempotent. Duplicate mirror rows are collapsed
+    to the newest; on MySQL a failure is only reported, since altering the site table may need a DBA."""
+    cur = conn.cursor()
+    if dialect == "sqlite":
+        cur.execute(f"""DELETE FROM {TABLE_NAME} WHERE id NOT IN (
+            SELECT MAX(id) FROM {TABLE_NAME} GROUP BY Folder, File_Name)""")
+        cur.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {UNIQUE_INDEX} ON {TABLE_NAME} (Folder, File_Name)")
+        conn.commit()
+        return
+    import mysql.connector
+    cur.execute("SELECT COUNT(*) FROM information_schema.statistics "
+                "WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s",
+                (TABLE_NAME, UNIQUE_INDEX))
+    if cur.fetchone()[0]:
         return
+    # TEXT columns need a key prefix length; VARCHAR columns reject one that is too long.
+    for columns in ("Folder, File_Name", "Folder(100), File_Name(150)"):
+        try:
+            cur.execute(f"ALTER TABLE {TABLE_NAME} ADD UNIQUE KEY {UNIQUE_INDEX} ({columns})")
+            return
+        except mysql.connector.Error as e:
+            error = e
+    print(f"⚠️ Could not add unique key on {TABLE_NAME}(Folder, File_Name): {error}. "
+          f"Re-runs may duplicate rows until it exists.")
+
+def step_done(record, step):
+    return record.journal.get(step, (None, None))[0] == "done"
+
+def write_chunk(records, conn_remote, remote_dialect, mirror_conn, repo, journal, log_failure):
+    """Upsert a chunk remotely, then mirror it and flip it to Uploaded, so both sides commit together.
+    Steps the journal already has as done are skipped. If any step fails for the chunk it is
+    retried row by row to isolate the bad record; a row that still fails stays Approved."""
+    try:
+        todo = [r for r in records if r.remote_mode != "none" and not step_done(r, "remote_row")]
+        if todo:
+            ids = [r.id for r in todo]
+            journal.begin(ids, "remote_row")
+            with span("upload.remote", items=len(todo)):
+                cur = conn_remote.cursor()
+                upserts = [r.to_photo_params() for r in todo if r.remote_mode == "upsert"]
+                updates = [r.to_update_params() for r in todo if r.remote_mode == "update"]
+                if upserts:
+                    cur.executemany(upsert_sql(remote_dialect), upserts)
+                if updates:
+                    cur.executemany(update_sql(remote_dialect), updates)
+                conn_remote.commit()
+            mark_done(journal, todo, "remote_row")
+
+        # --- Local Mirror Insert ---
+        todo = [r for r in records if r.remote_mode != "none" and not step_done(r, "mirror_insert")]
+        if todo:
+            ids = [r.id for r in todo]
+            journal.begin(ids, "mirror_insert")
+            with span("upload.mirror", items=len(todo)), mirror_conn:
+                mirror_conn.executemany(upsert_sql("sqlite", PHOTO_FIELDS + MIRROR_DIGEST_FIELDS),
+                                        [r.to_mirror_params() for r in todo])
+            mark_done(journal, todo, "mirror_insert")
+
+        # --- Mark as uploaded locally ---
+        ids = [r.id for r in records]
+        journal.begin(ids, "status_flip")
+        repo.set_status(ids, "Uploaded")
+        journal.clear(ids)
+    except Exception as e:
+        conn_remote.rollback()
+        if len(records) == 1:
+            log_failure(records[0].File_Name, e)
+            return 0, 1
+        ok = bad = 0
+        for record in records:
+            o, b = write_chunk([record], conn_remote, remote_dialect, mirror_conn, repo, journal, log_failure)
+            ok, bad = ok + o, bad + b
+        return ok, bad
+    return len(records), 0
+
+def mark_done(journal, records, step):
+    """Journal `step` as done, and remember it on the records so a row-by-row retry skips it."""
+    journal.done([r.id for r in records], step)
+    for record in records:
+        record.journal[step] = ("done", None)
+
+def transfer(pool, journal, record, step, local_file, remote_dir, digest):
+    """Send one file unless delta sync, the journal or the server shows this exact file already
+    arrived. Returns the number of bytes actually sent."""
+    if step in record.skip_steps:
+        return 0
+    detail = {"size": os.path.getsize(local_file), "sha256": digest}
+    state, previous = record.journal.get(step, (None, None))
+    if previous == detail:
+        if state == "done":
+            return 0
+        # Interrupted after or during STOR: trust the server copy if the size matches.
+        if pool.remote_size(remote_dir, record.File_Name) == detail["size"]:
+            journal.done([record.id], step, detail)
+            return 0
+    journal.begin([record.id], step, detail)
+    with span("upload.ftp", file=record.File_Name, bytes_out=detail["size"], step=step):
+        pool.store(local_file, remote_dir, record.File_Name)
+    journal.done([record.id], step, detail)
+    return detail["size"]
+
+def upload_files(pool, journal, record):
+    """Send the image and its thumbnail for one record over pooled sessions (records run in parallel)."""
+    sent = transfer(pool, journal, record, "image_stor", record.local_img, record.remote_img_dir,
+                    record.img_hash)
+    sent += transfer(pool, journal, record, "thumb_stor", record.local_thumb, record.remote_thumb_dir,
+                     record.thumb_hash)
+    return sent
+
+def upload(chunk_size=REMOTE_CHUNK_SIZE, conn_remote=None, remote_dialect="mysql", delta=DELTA_SYNC):
+    """Publish every Approved row. `conn_remote` defaults to the MySQL server in MYSQL; any
+    DB-API connection works if `remote_dialect` says how to upsert into it ("mysql" or "sqlite").
+    With `delta`, rows whose files and metadata match the mirror are only marked Uploaded, and
+    metadata-only edits become UPDATEs without any FTP transfer. Returns (uploaded, failed)."""
+    repo = get_repository(DB_PATH)
+    records = repo.approved(UploadRecord)
+
+    if not records:
+        print("Nothing approved for upload.")
+        return 0, 0
 
     # Connect to MySQL, FTP, and local mirror DB
-    conn_remote = mysql.connector.connect(**MYSQL)
-    cursor = conn_remote.cursor()
-    ftp = FTP()
-    ftp.connect(FTP_CONFIG["host"], FTP_CONFIG["port"])
-    ftp.login(FTP_CONFIG["user"], FTP_CONFIG["passwd"])
-
-    mirror_conn = sqlite3.connect(LOCAL_MIRROR_DB)
-    mirror_cur = mirror_conn.cursor()
-    mirror_cur.execute(f"""CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        Folder TEXT, File_Name TEXT, Path TEXT, Thumb_Path TEXT, DateTime TEXT, Camera TEXT, Lens_model TEXT,
-        Width INTEGER, Height INTEGER, Exposure TEXT, Aperture TEXT, ISO INTEGER, Focal_length INTEGER,
-        Keywords TEXT, Caption TEXT, Location TEXT, QR REAL, QC_Status TEXT, Original_File_Name TEXT
-    )""")
-    mirror_conn.commit()
-
-    success, fail = 0, 0
-
-    for row in rows:
-        record = dict(zip(cols, row))
-        year = str(record["DateTime"])[:4]
-        file_name = record["File_Name"]
-        # For folder_key, prefer original key if in folder_map, else fall back to value.
-        folder_key = next((k for k, v in folder_map.items() if v == record["Folder"]), record["Folder"])
-
-        local_img = os.path.join(LOCAL_BASE, year, folder_key, file_name)
-        local_thumb = os.path.join(LOCAL_BASE, year, "thumbs", folder_key, file_name)
-
-        remote_img_dir = f"{REMOTE_BASE}/{year}/{folder_key}"
-        remote_thumb_dir = f"{REMOTE_BASE}/{year}/thumbs/{folder_key}"
+    owns_remote = conn_remote is None
+    if owns_remote:
+        import mysql.connector  # only needed for the real site; tests pass an SQLite connection
+        conn_remote = mysql.connector.connect(**MYSQL)
+        remote_dialect = "mysql"
+    pool = journal = mirror_conn = None
+    try:
+        ensure_unique_key(conn_remote, remote_dialect)
+        pool = FTPPool(FTP_CONFIG, size=FTP_SESSIONS)
+        journal = UploadJournal()
+        mirror_conn = connect(LOCAL_MIRROR_DB, migrate_schema=False)
+        mirror_conn.execute(f"""CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            Folder TEXT, File_Name TEXT, Path TEXT, Thumb_Path TEXT, DateTime TEXT, Camera TEXT, Lens_model TEXT,
+            Width INTEGER, Height INTEGER, Exposure TEXT, Aperture TEXT, ISO INTEGER, Focal_length INTEGER,
+            Keywords TEXT, Caption TEXT, Location TEXT, QR REAL, QC_Status TEXT, Original_File_Name TEXT
+        )""")
+        mirror_conn.commit()
+        ensure_unique_key(mirror_conn, "sqlite")
+        ensure_mirror_digest_columns(mirror_conn)
 
-        try:
-            # --- MySQL Upload ---
-            sql = f"""INSERT INTO {TABLE_NAME} (
-                Folder, File_Name, Path, Thumb_Path, DateTime, Camera, Lens_model,
-                Width, Height, Exposure, Aperture, ISO, Focal_length,
-                Keywords, Caption, Location, QR, QC_Status, Original_File_Name
-            ) VALUES (
-                %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
-                %s, %s, %s, %s, %s, %s
-            )"""
-            data = [
-                record["Folder"],
-                record["File_Name"],
-                record["Path"],
-                record["Thumb_Path"],
-                record["DateTime"],
-                record["Camera"],
-                record["Lens_model"],
-                int(record["Width"]),
-                int(record["Height"]),
-                record["Exposure"],
-                record["Aperture"],
-                int(record["ISO"]),
-                int(record["Focal_length"]),
-                record["Keywords"],
-                record["Caption"],
-                record["Location"],
-                record["QR"],
-                record["QC_Status"],
-                record.get("Original_File_Name", ""),
-            ]
-            cursor.execute(sql, tuple(data))
-
-            # --- FTP Upload ---
-            mkdir_p(ftp, remote_img_dir)
-            with open(local_img, "rb") as f:
-                ftp.storbinary(f"STOR " + file_name, f)
-            mkdir_p(ftp, remote_thumb_dir)
-            with open(local_thumb, "rb") as f:
-                ftp.storbinary(f"STOR " + file_name, f)
-
-            # --- Local Mirror Insert ---
-            mirror_sql = f"""INSERT OR REPLACE INTO {TABLE_NAME} (
-                Folder, File_Name, Path, Thumb_Path, DateTime, Camera, Lens_model,
-                Width, Height, Exposure, Aperture, ISO, Focal_length,
-                Keywords, Caption, Location, QR, QC_Status, Original_File_Name
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"""
-            mirror_data = [
-                record["Folder"],
-                record["File_Name"],
-                record["Path"],
-                record["Thumb_Path"],
-                record["DateTime"],
-                record["Camera"],
-                record["Lens_model"],
-                int(record["Width"]),
-                int(record["Height"]),
-                record["Exposure"],
-                record["Aperture"],
-                int(record["ISO"]),
-                int(record["Focal_length"]),
-                record["Keywords"],
-                record["Caption"],
-                record["Location"],
-                record["QR"],
-                record["QC_Status"],
-                record.get("Original_File_Name", ""),
-            ]
-            mirror_cur.execute(mirror_sql, tuple(mirror_data))
-            mirror_conn.commit()
-
-            # --- Mark as uploaded locally ---
-            c.execute(f"UPDATE {REVIEW_QUEUE} SET Review_Status = 'Uploaded' WHERE id = ?", (record["id"],))
-            conn_local.commit()
-            success += 1
-
-        except Exception as e:
+        success, fail = 0, 0
+
+        def log_failure(file_name, e):
             msg = f"❌ Failed: {file_name} → {e}"
             print(msg)
             with open(LOG_FILE, "a", encoding="utf-8") as log:
                 log.write(msg + "\n")
-            fail += 1
 
-    # Finalize and close connections
-    try:
-        conn_remote.commit()
-    except Exception:
-        pass
-    cursor.close()
-    conn_remote.close()
-    conn_local.close()
-    mirror_conn.close()
-    ftp.quit()
+        folder_map = load_folder_map()
+        for record in records:
+            year = str(record.DateTime)[:4]
+            # For folder_key, prefer original key if in folder_map, else fall back to value.
+            folder_key = next((k for k, v in folder_map.items() if v == record.Folder), record.Folder)
+
+            record.local_img = os.path.join(LOCAL_BASE, year, folder_key, record.File_Name)
+            record.local_thumb = os.path.join(LOCAL_BASE, year, "thumbs", folder_key, record.File_Name)
+            record.remote_img_dir = f"{REMOTE_BASE}/{year}/{folder_key}"
+            record.remote_thumb_dir = f"{REMOTE_BASE}/{year}/thumbs/{folder_key}"
+
+        states = journal.load([r.id for r in records])
+        for record in records:
+            record.journal = states[record.id]
+        resumed = sum(1 for r in records if r.journal)
+        if resumed:
+            print(f"Resuming {resumed} image(s) from an interrupted upload.")
+
+        with span("upload.plan", items=len(records)):  # hashes every local file when delta syncing
+            counts = plan_delta(records, mirror_conn, delta)
+        if delta:
+            print(f"Delta sync: {counts['upsert']} new/changed files, {counts['update']} metadata-only, "
+                  f"{counts['none']} unchanged.")
+
+        # --- FTP Upload (parallel sessions) ---
+        uploaded = []
+        sent_bytes = 0
+        with ThreadPoolExecutor(max_workers=FTP_SESSIONS) as executor:
+            futures = [(record, executor.submit(upload_files, pool, journal, record)) for record in records]
+            for record, future in futures:
+                try:
+                    sent_bytes += future.result()
+                    uploaded.append(record)
+                except Exception as e:
+                    log_failure(record.File_Name, e)
+                    fail += 1
+        pool.close()
+        if pool.reconnects:
+            print(f"FTP sessions reconnected {pool.reconnects} time(s).")
+        print(f"FTP: sent {sent_bytes / 1_048_576:.1f} MB.")
+
+        # --- MySQL upsert + local mirror + status flip, one chunk at a time ---
+        for start in range(0, len(uploaded), chunk_size):
+            ok, bad = write_chunk(uploaded[start:start + chunk_size], conn_remote, remote_dialect,
+                                  mirror_conn, repo, journal, log_failure)
+            success, fail = success + ok, fail + bad
+    finally:
+        # Close everything even if a step raised, so the journal and both databases are released
+        if pool:
+            pool.close()
+        if owns_remote:
+            conn_remote.close()
+        repo.close()
+        if mirror_conn:
+            mirror_conn.close()
+        if journal:
+            journal.close()
 
     print(f"✅ Done. Uploaded {success}, Failed {fail}")
     if fail:
         print(f"Check: {LOG_FILE}")
+    return success, fail
 
 if __name__ == "__main__":
-    upload()
+    parser = argparse.ArgumentParser(description="Upload approved images to MySQL and FTP.")
+    parser.add_argument("--chunk-size", type=int, default=REMOTE_CHUNK_SIZE,
+                        help="rows per remote upsert/commit")
+    parser.add_argument("--full", action="store_true",
+                        help="send every approved file and row, ignoring delta sync")
+    args = parser.parse_args()
+    upload(chunk_size=max(1, args.chunk_size), delta=not args.full)
@@ -1,21 +1,33 @@
 import os
 import sys
-import sqlite3
 import json
-import shutil
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 import subprocess
 import threading
+import time
 
-from utils.file_namer import get_exif_data, get_camera_model, get_exif_year, generate_unique_filename
-from utils.metadata_builder import build_metadata
+from utils.ingest import ingest_images, INGEST_WORKERS
+from utils.stream_scoring import StreamingScorer
+from batch_image_quality_score import ScoringWorker, shutdown_pools
+from utils.repository import get_repository
+from utils.exif_index import ExifIndex
+from utils import tracing
 
 DB_PATH = "data/review.db"
 TABLE_NAME = "review_queue"
 INCOMING_DIR = r"C:\Users\YOUR_USERNAME\incoming"
 LOCATION_FILE = os.path.join("data", "location_list.json")
 FOLDER_MAP_FILE = os.path.join("data", "folder_map.json")
+# Opt-in: score through a long-lived worker process (model stays loaded between batches)
+# instead of starting a cold `batch_image_quality_score.py` interpreter every time.
+USE_SCORING_WORKER = False
+# Score rows while later files are still being ingested, and open the review editor as
+# soon as REVIEW_AFTER_SCORED images have scores. Scores in this process unless
+# USE_SCORING_WORKER is set.
+STREAM_SCORING = True
+STREAM_CHUNK = 8
+REVIEW_AFTER_SCORED = 10
 
 class ImageAutomationApp:
     def __init__(self, root):
@@ -48,8 +60,19 @@ class ImageAutomationApp:
         self.file_list = tk.Listbox(frm, width=80, height=8)
         self.file_list.grid(row=4, column=0, columnspan=2, pady=5)
         ttk.Button(frm, text="Start Batch", command=lambda: threading.Thread(target=self.proceed).start()).grid(row=5, column=0, columnspan=2, pady=10)
+        self.progress = ttk.Progressbar(frm, mode="determinate")
+        self.progress.grid(row=6, column=0, columnspan=2, sticky="ew")
+        self.status_var = tk.StringVar(value="Idle")
+        ttk.Label(frm, textvariable=self.status_var).grid(row=7, column=0, columnspan=2, sticky="w")
         frm.columnconfigure(1, weight=1)
 
+    def set_progress(self, stage, done, total):
+        # Called from the batch thread; Tk widgets may only be touched from the main loop.
+        def update():
+            self.progress.config(maximum=max(total, 1), value=done)
+            self.status_var.set(f"{stage}: {done}/{total}")
+        self.root.after(0, update)
+
     def load_json(self, path):
         try:
             with open(path, 'r', encoding='utf-8') as f:
@@ -77,6 +100,14 @@ class ImageAutomationApp:
             self.file_list.delete(0, tk.END)
             for f in self.images:
                 self.file_list.insert(tk.END, os.path.basename(f))
+            # Parse EXIF headers while the fields are being filled in; ingest then hits the index.
+            threading.Thread(target=self.warm_exif_index, args=(list(self.images),), daemon=True).start()
+
+    def warm_exif_index(self, paths):
+        index = ExifIndex()
+        new, known, failed = index.index_paths(paths)
+        index.close()
+        print(f"[EXIF] Indexed {new} file(s) in the background ({known} already indexed, {len(failed)} failed).")
 
     def proceed(self):
         print("\n[STAGE 1] Input validation and collecting files...")
@@ -94,59 +125,65 @@ class ImageAutomationApp:
             print("[ERROR] No images selected.")
             return
 
-        print("[STAGE 2] Preparing database and moving images to incoming folder...")
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-
-        c.execute(f"SELECT name FROM sqlite_master WHERE type='table' AND name='{TABLE_NAME}'")
-        exists = c.fetchone()
-        if not exists:
-            c.execute(f"""CREATE TABLE {TABLE_NAME} (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                Folder TEXT, File_Name TEXT, Path TEXT, Thumb_Path TEXT,
-                DateTime TEXT, Camera TEXT, Lens_model TEXT, Width INTEGER,
-                Height INTEGER, Exposure TEXT, Aperture TEXT, ISO INTEGER,
-                Focal_length INTEGER, Keywords TEXT, Caption TEXT, Location TEXT,
-                Subject TEXT, QR INTEGER, QC_Status TEXT, Review_Status TEXT,
-                Original_File_Name TEXT
-            )""")
-            conn.commit()
-
-        os.makedirs(INCOMING_DIR, exist_ok=True)
-        for src in self.images:
-            original_name = os.path.basename(src)
-            incoming_path = os.path.join(INCOMING_DIR, original_name)
-            if not os.path.exists(incoming_path):
-                shutil.move(src, incoming_path)
-
-            exif = get_exif_data(incoming_path)
-            cam = get_camera_model(exif)
-            year = get_exif_year(exif)
-            suggested_name = generate_unique_filename(subj, loc, fld, cam, year)
-            meta = build_metadata(incoming_path, "", suggested_name, fld, year, loc, subj)
-            meta["Review_Status"] = "Pending"
-            meta["Original_File_Name"] = original_name
-            meta["Path"] = incoming_path
-            meta["Thumb_Path"] = ""
-
-            fields = ",".join(meta.keys())
-            placeholders = ",".join(["?"] * len(meta))
-            sql = f"INSERT INTO {TABLE_NAME} ({fields}) VALUES ({placeholders})"
-            c.execute(sql, tuple(meta.values()))
-
-        conn.commit()
-        conn.close()
-        print(f"[STAGE 3] Inserted {len(self.images)} images to DB. Moving to scoring...")
-
-        messagebox.showinfo("Batch Ready", f"✅ {len(self.images)} images ready for scoring & review.")
+        # Set before any scorer/editor process starts, so they all trace into this run.
+        run_id = tracing.run_id()
+        print(f"[STAGE 2] Preparing database and moving images to incoming folder (run {run_id})...")
+        # Opening the shared connection creates review_queue or migrates it (utils/db_schema.py).
+        get_repository(DB_PATH).conn
+
+        streamer = None
+        if STREAM_SCORING:
+            streamer = StreamingScorer(worker=ScoringWorker() if USE_SCORING_WORKER else None,
+                                       review_after=REVIEW_AFTER_SCORED)
+            streamer.start()
+
+        started = time.perf_counter()
+        with tracing.span("main.ingest", items=len(self.images)):
+            inserted, failures = ingest_images(
+                self.images, subj, loc, fld, INCOMING_DIR, DB_PATH,
+                workers=INGEST_WORKERS, progress=self.set_progress,
+                chunk_size=STREAM_CHUNK if streamer else None,
+                on_inserted=streamer.rows_inserted if streamer else None,
+            )
+        if streamer:
+            streamer.ingestion_done()
+        for src, err in failures:
+            print(f"❌ Failed to ingest {src}: {err}")
+        print(f"[STAGE 3] Inserted {inserted} images to DB in {time.perf_counter() - started:.2f}s. Moving to scoring...")
+
+        messagebox.showinfo("Batch Ready", f"✅ {inserted} images ready for scoring & review."
+                            + (f"\n❌ {len(failures)} failed (see console)." if failures else ""))
+        self.root.after(0, self.status_var.set, "Scoring...")
 
         # Score images using external script
         print("[STAGE 4] Starting image scoring (this can take a moment)...")
-        subprocess.run([sys.executable, "batch_image_quality_score.py"], check=True)
+        started = time.perf_counter()
+        with tracing.span("main.score", items=inserted):
+            if streamer:
+                streamer.review_ready.wait()
+                if streamer.error:
+                    print(f"❌ Streaming scorer failed: {streamer.error}")
+                print(f"[STAGE 4] {streamer.scored} images scored, first review-ready after "
+                      f"{streamer.first_review_at:.2f}s; the rest keep scoring in the background.")
+            elif USE_SCORING_WORKER:
+                worker = ScoringWorker()
+                worker.start()
+                result = worker.score()
+                print(f"[STAGE 4] Warm worker scored {result['scored']} (failed {result['failed']}) "
+                      f"in {result['seconds']}s, model {'warm' if result['warm'] else 'cold'}.")
+            else:
+                subprocess.run([sys.executable, "batch_image_quality_score.py"], check=True)
+        print(f"[STAGE 4] Scoring stage took {time.perf_counter() - started:.2f}s")
         print("[STAGE 5] Scoring done. Launching review/approval interface...")
 
-        subprocess.run([sys.executable, "review_editor.py"], check=False)
-        print("[STAGE 6] Review/editor closed. Exiting main UI.")
+        with tracing.span("main.review"):
+            subprocess.run([sys.executable, "review_editor.py"], check=False)
+        if streamer:
+            streamer.finished.wait()
+            print(f"[STAGE 5] Background scoring finished: {streamer.scored} scored, {streamer.failed} failed.")
+            shutdown_pools()
+        tracing.flush()
+        print(f"[STAGE 6] Review/editor closed. Exiting main UI. Run report: python -m pipeline report --run {run_id}")
         self.root.destroy()
 
 if __name__ == '__main__':
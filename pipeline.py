@@ -0,0 +1,232 @@
+"""Headless command line for the pipeline stages (no Tk, no display needed).
+
+    python -m pipeline ingest FILES_OR_FOLDERS... --subject S --location L --folder F [--score]
+    python -m pipeline score [--workers N] [--batch-size N] [--limit N] [--no-cache] [--cascade]
+    python -m pipeline render [--status Processing Failed] [--ids 12 13] [--workers N]   (editor closed)
+    python -m pipeline upload [--chunk-size N] [--full]
+    python -m pipeline status
+    python -m pipeline report [--run ID] [--runs N] [--slowest N]
+
+stdout carries one JSON object per line ({"event": ..., "stage": ..., ...}), ending with
+a "result" event, so runs can be scripted and each stage timed on its own. The stages'
+own human-readable messages go to stderr.
+
+Stage commands trace into data/trace.db (utils/tracing.py) under a run id, given in their
+result; set PIPELINE_RUN_ID to group several commands into one run. `report` summarizes a
+run (default: the latest): items/s, p50/p95 latency and MB per stage, and the slowest files.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from contextlib import nullcontext, redirect_stdout
+
+from utils import tracing
+from utils.db_schema import DB_PATH
+from utils.repository import get_repository
+
+INCOMING_DIR = r"C:\Users\YOUR_USERNAME\incoming"
+FOLDER_MAP_FILE = "data/folder_map.json"
+PROGRESS_EVERY = 0.5   # seconds between progress events for the same stage
+UNTRACED = ("status", "report")   # read-only; they don't start a run
+
+class Reporter:
+    """Writes JSON lines to the real stdout; rate-limits progress events."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.started = time.perf_counter()
+        self._last = {}
+
+    def emit(self, event, **fields):
+        fields = {"event": event, "t": round(time.perf_counter() - self.started, 3), **fields}
+        self.stream.write(json.dumps(fields, default=str) + "\n")
+        self.stream.flush()
+
+    def progress(self, stage, done, total):
+        now = time.perf_counter()
+        if done < total and now - self._last.get(stage, 0) < PROGRESS_EVERY:
+            return
+        self._last[stage] = now
+        self.emit("progress", stage=stage, done=done, total=total)
+
+def cmd_ingest(args, reporter):
+    from utils.exif_index import find_images
+    from utils.ingest import ingest_images, INGEST_WORKERS
+
+    folder_keys = {}
+    if os.path.exists(FOLDER_MAP_FILE):
+        with open(FOLDER_MAP_FILE, encoding="utf-8") as f:
+            folder_keys = {v: k for k, v in json.load(f).items()}
+    images = list(find_images(args.targets))
+    reporter.emit("start", stage="ingest", files=len(images))
+
+    streamer = None
+    if args.score:
+        from utils.stream_scoring import StreamingScorer
+        streamer = StreamingScorer(review_after=1)
+        streamer.start()
+    inserted, failures = ingest_images(
+        images, args.subject, args.location, folder_keys.get(args.folder, args.folder),
+        args.incoming_dir, DB_PATH, workers=args.workers or INGEST_WORKERS, progress=reporter.progress,
+        chunk_size=8 if streamer else None, on_inserted=streamer.rows_inserted if streamer else None,
+    )
+    for src, err in failures:
+        reporter.emit("error", stage="ingest", file=src, error=err)
+    result = {"inserted": inserted, "failed": len(failures)}
+    if streamer:
+        from batch_image_quality_score import shutdown_pools
+        streamer.ingestion_done()
+        streamer.finished.wait()
+        shutdown_pools()
+        result.update(scored=streamer.scored, score_failed=streamer.failed,
+                      score_error=str(streamer.error) if streamer.error else None)
+    return result
+
+def cmd_score(args, reporter):
+    from batch_image_quality_score import score_pending, shutdown_pools
+
+    reporter.emit("start", stage="score")
+    try:
+        scored, failed = score_pending(workers=args.workers, batch_size=args.batch_size, use_cache=not args.no_cache,
+                                       limit=args.limit, progress=reporter.progress, cascade=args.cascade,
+                                       rescore_skipped=args.rescore_skipped,
+                                       cascade_learned=args.cascade_learned_ceiling)
+    finally:
+        shutdown_pools()
+    return {"scored": scored, "failed": failed}
+
+RENDERABLE = ("Processing", "Failed")   # approvals that were interrupted or failed
+
+def cmd_render(args, reporter):
+    """Re-run approvals. Only Processing/Failed rows: an Approved/Uploaded row's Path is already its
+    public URL. A review editor that is still open has its own approvals in Processing, so close it
+    first or the same file is processed twice."""
+    from utils.approval import ApprovalQueue, approval_job, APPROVAL_WORKERS
+
+    repo = get_repository(DB_PATH)
+    if args.ids:
+        rows = []
+        for img_id in args.ids:
+            row = repo.get(img_id)
+            if row and row.Review_Status in RENDERABLE:
+                rows.append(row)
+            else:
+                reporter.emit("error", stage="render", id=img_id,
+                              error=f"not rendered: Review_Status is {row.Review_Status if row else 'missing'}, "
+                                    f"only {'/'.join(RENDERABLE)} rows can be")
+    else:
+        marks = ",".join(["?"] * len(args.status))
+        rows = repo.select(f"Review_Status IN ({marks})", args.status)
+    reporter.emit("start", stage="render", rows=len(rows))
+    approvals = ApprovalQueue(DB_PATH, workers=args.workers or APPROVAL_WORKERS)
+    for row in rows:
+        repo.update(row.id, {}, "Processing")
+        approvals.submit(approval_job(row))
+    done = 0
+    while done < len(rows):
+        time.sleep(0.2)
+        for job, updates, error in approvals.poll():
+            done += 1
+            if error:
+                reporter.emit("error", stage="render", id=job["id"], file=job["name"], error=str(error))
+            reporter.progress("render", done, len(rows))
+    approvals.wait()
+    return {"approved": len(rows) - len(approvals.failures), "failed": len(approvals.failures)}
+
+def cmd_upload(args, reporter):
+    from db_uploader import upload, REMOTE_CHUNK_SIZE
+
+    reporter.emit("start", stage="upload")
+    uploaded, failed = upload(chunk_size=max(1, args.chunk_size or REMOTE_CHUNK_SIZE), delta=not args.full)
+    return {"uploaded": uploaded, "failed": failed}
+
+def cmd_status(args, reporter):
+    repo = get_repository(DB_PATH)
+    by_review = dict(repo.conn.execute(
+        "SELECT COALESCE(Review_Status, 'NULL'), COUNT(*) FROM review_queue GROUP BY 1").fetchall())
+    by_score = dict(repo.conn.execute(
+        "SELECT COALESCE(Score_State, 'NULL'), COUNT(*) FROM review_queue GROUP BY 1").fetchall())
+    by_qc = dict(repo.conn.execute(
+        "SELECT COALESCE(QC_Status, 'NULL'), COUNT(*) FROM review_queue GROUP BY 1").fetchall())
+    return {"total": repo.count(), "review_status": by_review, "score_state": by_score, "qc_status": by_qc}
+
+def cmd_report(args, reporter):
+    if args.runs:
+        return {"runs": [{"run_id": rid, "started": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(started)),
+                          "spans": spans} for rid, started, spans in tracing.runs(args.runs)]}
+    summary = tracing.summarize(args.run, slowest=args.slowest)
+    if summary is None:
+        raise RuntimeError(f"No spans recorded for {'run ' + args.run if args.run else 'any run'} in {tracing.TRACE_DB}")
+    print(tracing.format_summary(summary))
+    return summary
+
+def build_parser():
+    from batch_image_quality_score import DEFAULT_WORKERS, DEFAULT_BATCH_SIZE
+
+    parser = argparse.ArgumentParser(prog="python -m pipeline", description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("ingest", help="move, parse and insert images into review_queue")
+    p.add_argument("targets", nargs="+", help="image files or folders (searched recursively)")
+    p.add_argument("--subject", required=True)
+    p.add_argument("--location", required=True)
+    p.add_argument("--folder", required=True, help="folder key, or its readable name from folder_map.json")
+    p.add_argument("--incoming-dir", default=INCOMING_DIR)
+    p.add_argument("--workers", type=int, help="staging threads (default: utils.ingest.INGEST_WORKERS)")
+    p.add_argument("--score", action="store_true", help="score rows as they are inserted")
+    p.set_defaults(func=cmd_ingest)
+
+    p = sub.add_parser("score", help="score every row without QR/QC_Status")
+    p.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    p.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    p.add_argument("--limit", type=int)
+    p.add_argument("--no-cache", action="store_true")
+    p.add_argument("--cascade", action="store_true", help="skip the models for frames that can only be Low")
+    p.add_argument("--cascade-learned-ceiling", action="store_true",
+                   help="lossy: cap NIMA at the 99th percentile of stored scores so --cascade skips more")
+    p.add_argument("--rescore-skipped", action="store_true", help="also score rows a --cascade run skipped")
+    p.set_defaults(func=cmd_score)
+
+    p = sub.add_parser("render", help="archive/move/render rows as the review editor's Approve does "
+                                      "(close the review editor first)")
+    p.add_argument("--status", nargs="+", default=["Processing"], choices=RENDERABLE,
+                   help="Review_Status values to process (default: Processing, i.e. interrupted approvals)")
+    p.add_argument("--ids", nargs="+", type=int,
+                   help="specific row ids instead of --status (only Processing/Failed rows are rendered)")
+    p.add_argument("--workers", type=int, help="approval threads (default: utils.approval.APPROVAL_WORKERS)")
+    p.set_defaults(func=cmd_render)
+
+    p = sub.add_parser("upload", help="publish Approved rows to MySQL/FTP")
+    p.add_argument("--chunk-size", type=int, help="rows per remote upsert (default: db_uploader.REMOTE_CHUNK_SIZE)")
+    p.add_argument("--full", action="store_true", help="ignore delta sync")
+    p.set_defaults(func=cmd_upload)
+
+    p = sub.add_parser("status", help="row counts by Review_Status / Score_State / QC_Status")
+    p.set_defaults(func=cmd_status)
+
+    p = sub.add_parser("report", help="throughput, p50/p95 latency per stage and slowest files of a traced run")
+    p.add_argument("--run", help="run id (default: the latest)")
+    p.add_argument("--runs", type=int, metavar="N", help="list the N most recent runs instead")
+    p.add_argument("--slowest", type=int, default=tracing.SLOWEST, help="slowest per-file spans to list")
+    p.set_defaults(func=cmd_report)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    reporter = Reporter(sys.stdout)
+    run = {} if args.command in UNTRACED else {"run_id": tracing.run_id()}
+    try:
+        with redirect_stdout(sys.stderr), (tracing.span(f"pipeline.{args.command}") if run else nullcontext()):
+            result = args.func(args, reporter)
+    except Exception as e:
+        reporter.emit("result", stage=args.command, ok=False, error=str(e), **run)
+        return 1
+    finally:
+        tracing.flush()
+    reporter.emit("result", stage=args.command, ok=True, **run, **result)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,25 +1,33 @@
 import os
 import sys
 import shutil
-import sqlite3
 import subprocess
-from tkinter import Tk, Label, Entry, Button, StringVar, messagebox, Frame, Text, END, DISABLED
-from PIL import Image, ImageTk
+import time
+import argparse
+from tkinter import Tk, Label, Entry, Button, StringVar, messagebox, Frame, Text, END, DISABLED, NORMAL, Listbox, MULTIPLE
+from PIL import ImageTk
 
 # --- CONFIGURATION ---
 DB_PATH = 'data/review.db'
 TABLE_NAME = 'review_queue'
 INCOMING_DIR = r"C:\Users\YOUR_USERNAME\incoming"
 REJECTED_FOLDER = r'C:\Users\YOUR_USERNAME\Desktop\rejected'
-LOCAL_BASE = r"C:\Users\YOUR_USERNAME\images"
-DESKTOP_ROOT = r"C:\Users\YOUR_USERNAME\Desktop\photos"
-ARCHIVE_ROOT = r"C:\Users\YOUR_USERNAME\Pictures"
-FONT_PATH = "fonts/Montserrat-Light.ttf"
-WATERMARK_TEXT = "your_watermark_here"
+# Approval output folders (LOCAL_BASE, DESKTOP_ROOT, ARCHIVE_ROOT) and the site URL live in utils/approval.py.
+# Watermark text/font/size/opacity and output sizes live in config.yaml (see utils/renderer.py).
+PREVIEW_CACHE_SIZE = 32   # decoded 600px previews kept in memory
+PREFETCH_AHEAD = 3        # images after the current one decoded in the background
+PREFETCH_BEHIND = 1       # ...and before it, so Back is instant too
+REVIEW_PAGE_SIZE = 50     # rows fetched per page of the review queue
+QC_BUCKETS = ['Top', 'Good', 'Average', 'Low', 'NA']
 # --- END CONFIGURATION --- 
 
-from utils.image_processor import resize_and_watermark
+from utils.approval import ApprovalQueue, approval_job
 from utils.file_namer import generate_unique_filename
+from utils.preview_cache import PreviewCache, Prefetcher, decode_preview
+from utils.preview_store import lookup as stored_image
+from utils.repository import get_repository
+from utils.review_queue_model import ReviewQueue
+from utils.tracing import span
 
 QR_EXPLANATION = (
     "QR (Quality Rating) Guide:\n"
@@ -47,17 +55,21 @@ def qc_status(qr):
         return "Low"
 
 class ReviewApp:
-    def __init__(self, master):
+    def __init__(self, master, page_size=REVIEW_PAGE_SIZE, qc_buckets=None, folder=None, qr_min=None, qr_max=None):
         self.master = master
         self.master.title("Amir2000 Image Review & Publish")
-        self.conn = sqlite3.connect(DB_PATH)
-        self.cur = self.conn.cursor()
-        self.images = self.get_images_to_review()
-        self.idx = 0
+        self.repo = get_repository(DB_PATH)
+        # Rows are paged in on demand (keyset on id) instead of loading the whole queue.
+        self.queue = ReviewQueue(self.repo, page_size, qc_buckets, folder, qr_min, qr_max)
         self.field_vars = {}
         self.text_widgets = {}
+        self.previews = PreviewCache(PREVIEW_CACHE_SIZE)
+        self.prefetcher = Prefetcher(self.previews)
+        self.approvals = ApprovalQueue(DB_PATH)
         self.build_layout()
-        if self.images:
+        self.set_filter_fields(qc_buckets, folder, qr_min, qr_max)
+        self.master.after(200, self.poll_approvals)
+        if self.queue.current:
             self.load_image()
         else:
             messagebox.showinfo("No Images", "No images found to review.")
@@ -77,12 +89,19 @@ class ReviewApp:
         self.qr_info.config(state=DISABLED)
         self.qr_info.pack(pady=(10, 0))
 
+        self.approval_status = StringVar(value="Approvals in flight: 0")
+        Label(self.left_frame, textvariable=self.approval_status, fg='#144', font=('Arial', 9),
+              wraplength=320, justify='left').pack(pady=(6, 0), anchor='w')
+
+        self.build_filters()
+
         labels = [
             'id', 'Folder', 'File_Name', 'Path', 'Thumb_Path', 'DateTime',
             'Camera', 'Lens_model', 'Width', 'Height', 'Exposure', 'Aperture',
             'ISO', 'Focal_length', 'Keywords', 'Caption', 'Location',
             'Subject', 'nima_score', 'blur_score', 'brightness_score', 'contrast_score',
-            'QR', 'QC_Status', 'Review_Status', 'Original_File_Name'
+            'QR', 'QC_Status', 'Review_Status', 'Original_File_Name', 'Dup_Group', 'Dup_Of',
+            'Extra_Scores', 'Score_State'
         ]
         for i, label in enumerate(labels):
             Label(self.right_frame, text=label).grid(row=i, column=0, sticky='e')
@@ -95,24 +114,90 @@ class ReviewApp:
                 entry = Entry(self.right_frame, textvariable=var, width=60)
                 entry.grid(row=i, column=1, sticky='w')
                 self.field_vars[label] = var
-                if label in ['id', 'Path', 'Thumb_Path', 'Original_File_Name']:
+                if label in ['id', 'Path', 'Thumb_Path', 'Original_File_Name', 'Dup_Group', 'Dup_Of',
+                             'Extra_Scores', 'Score_State']:
                     entry.config(state='readonly')
 
         Button(self.right_frame, text="Back", command=self.back).grid(row=99, column=0)
-        Button(self.right_frame, text="Approve", command=self.approve).grid(row=99, column=1)
-        Button(self.right_frame, text="Reject", command=self.reject).grid(row=99, column=2)
-        Button(self.right_frame, text="Pending", command=self.pending).grid(row=99, column=3)
-        Button(self.right_frame, text="Publish", command=self.publish).grid(row=99, column=4)
-
-    def get_images_to_review(self):
-        self.cur.execute(f"SELECT * FROM {TABLE_NAME} WHERE Review_Status IS NULL OR Review_Status != 'Uploaded' ORDER BY id")
-        rows = self.cur.fetchall()
-        colnames = [x[0] for x in self.cur.description]
-        return [dict(zip(colnames, row)) for row in rows]
+        # Everything that saves or moves the row; off while its approval is running.
+        self.action_buttons = []
+        for column, (text, command) in enumerate([("Approve", self.approve), ("Reject", self.reject),
+                                                  ("Pending", self.pending), ("Publish", self.publish)], start=1):
+            button = Button(self.right_frame, text=text, command=command)
+            button.grid(row=99, column=column)
+            self.action_buttons.append(button)
+
+    def build_filters(self):
+        filters = Frame(self.left_frame)
+        filters.pack(pady=(8, 0), anchor='w')
+        Label(filters, text="QC_Status").grid(row=0, column=0, sticky='ne')
+        self.qc_list = Listbox(filters, selectmode=MULTIPLE, height=len(QC_BUCKETS), width=10, exportselection=False)
+        for bucket in QC_BUCKETS:
+            self.qc_list.insert(END, bucket)
+        self.qc_list.grid(row=0, column=1, rowspan=4, sticky='w')
+        self.filter_vars = {}
+        for i, name in enumerate(['Folder', 'QR min', 'QR max', 'Jump to id']):
+            Label(filters, text=name).grid(row=i, column=2, sticky='e', padx=(8, 0))
+            var = StringVar()
+            Entry(filters, textvariable=var, width=12).grid(row=i, column=3, sticky='w')
+            self.filter_vars[name] = var
+        Button(filters, text="Apply", command=self.apply_filters).grid(row=4, column=3, sticky='w')
+        self.position = StringVar()
+        Label(self.left_frame, textvariable=self.position, fg='#144', font=('Arial', 9)).pack(anchor='w')
+
+    def set_filter_fields(self, qc_buckets, folder, qr_min, qr_max):
+        for i, bucket in enumerate(QC_BUCKETS):
+            if qc_buckets and bucket in qc_buckets:
+                self.qc_list.selection_set(i)
+        self.filter_vars['Folder'].set(folder or "")
+        self.filter_vars['QR min'].set("" if qr_min is None else str(qr_min))
+        self.filter_vars['QR max'].set("" if qr_max is None else str(qr_max))
+        self.update_position()
+
+    def apply_filters(self):
+        try:
+            qr_min = float(self.filter_vars['QR min'].get()) if self.filter_vars['QR min'].get().strip() else None
+            qr_max = float(self.filter_vars['QR max'].get()) if self.filter_vars['QR max'].get().strip() else None
+            start_id = int(self.filter_vars['Jump to id'].get()) if self.filter_vars['Jump to id'].get().strip() else None
+        except ValueError:
+            messagebox.showwarning("Filter", "QR min/max must be numbers and the id an integer.")
+            return
+        qc = [QC_BUCKETS[i] for i in self.qc_list.curselection()]
+        folder = self.filter_vars['Folder'].get().strip()
+        self.queue.set_filters(qc, folder, qr_min, qr_max, start_id)
+        self.filter_vars['Jump to id'].set("")
+        if self.queue.current:
+            self.load_image()
+        else:
+            self.update_position()
+            messagebox.showinfo("Filter", "No images match these filters.")
+
+    def update_position(self):
+        current = self.queue.current
+        text = f"Matching rows: {self.queue.count()}"
+        if current:
+            text = f"id {current.id}  |  " + text
+        self.position.set(text)
+
+    def refresh_scores(self, img_info):
+        # Scoring may still be running in the background when the editor opens.
+        scores = self.repo.scores(img_info.id)
+        if scores:
+            img_info.update(scores)
+
+    def prefetch_neighbours(self):
+        ahead, behind = self.queue.neighbours(PREFETCH_AHEAD, PREFETCH_BEHIND)
+        self.prefetcher.request([self.preview_source(info) for info in ahead + behind])
+
+    def preview_source(self, info):
+        # The preview store's 600px copy from ingest, or the original for rows without one.
+        return stored_image(info.Content_Hash, "preview") or info.Path
 
     def load_image(self):
-        img_info = self.images[self.idx]
-        for k, v in img_info.items():
+        started = time.perf_counter()
+        img_info = self.queue.current
+        self.refresh_scores(img_info)
+        for k, v in img_info.as_dict().items():
             if k in self.field_vars:
                 self.field_vars[k].set(str(v) if v is not None else "")
             if k in self.text_widgets:
@@ -120,10 +205,14 @@ class ReviewApp:
                 if v:
                     self.text_widgets[k].insert(END, str(v))
         # Show image (local or url)
-        orig_path = img_info.get("Path")
+        orig_path = img_info.Path
+        source = self.preview_source(img_info)
+        im = self.previews.get(source)
+        cached = im is not None
         try:
-            im = Image.open(orig_path)
-            im.thumbnail((600, 600))
+            if im is None:
+                im = decode_preview(source)
+                self.previews.put(source, im)
             img = ImageTk.PhotoImage(im)
             self.image_label.config(image=img)
             self.image_label.image = img
@@ -136,6 +225,11 @@ class ReviewApp:
             qr_val = None
         qc = qc_status(qr_val)
         self.field_vars['QC_Status'].set(qc)
+        self.prefetch_neighbours()
+        self.update_position()
+        self.update_actions()
+        print(f"[NAV] {os.path.basename(str(orig_path))}: {(time.perf_counter() - started) * 1000:.1f} ms "
+              f"({'prefetched' if cached else 'decoded on click'})")
 
     def get_field_values(self):
         values = {k: v.get() for k, v in self.field_vars.items()}
@@ -143,88 +237,100 @@ class ReviewApp:
             values[k] = txt.get("1.0", END).strip()
         return values
 
+    def processing(self):
+        """True while the current row's approval job owns its file (Review_Status 'Processing')."""
+        current = self.queue.current
+        return current is not None and current.Review_Status == 'Processing'
+
+    def update_actions(self):
+        state = DISABLED if self.processing() else NORMAL
+        for button in self.action_buttons:
+            button.config(state=state)
+        if state == DISABLED:
+            self.position.set(self.position.get() + "  |  approval running (a row left Processing by an "
+                              "earlier session is retried with: python -m pipeline render)")
+
     def save_current(self, status):
-        img_info = self.images[self.idx]
+        img_info = self.queue.current
         values = self.get_field_values()
         values['QC_Status'] = qc_status(values.get('QR'))
-        set_clause = ", ".join([f"{k} = ?" for k in values if k != 'id'])
-        sql = f"UPDATE {TABLE_NAME} SET {set_clause}, Review_Status=? WHERE id=?"
-        args = [values[k] for k in values if k != 'id'] + [status, img_info['id']]
-        self.cur.execute(sql, args)
-        self.conn.commit()
+        self.repo.update(img_info.id, values, status)
+        img_info.update(values)
+        img_info.Review_Status = status
 
     def approve(self):
-        img_info = self.images[self.idx]
-        values = self.get_field_values()
-        folder = values['Folder']
-        suggested_name = values['File_Name']
-        year = img_info['DateTime'][:4] if img_info.get('DateTime') else "unknown"
-        orig_path = img_info['Path']
-
-        web_dir = os.path.join(LOCAL_BASE, year, folder)
-        thumb_dir = os.path.join(LOCAL_BASE, year, "thumbs", folder)
-        desk_dir = os.path.join(DESKTOP_ROOT, folder)
-        archive_dir = os.path.join(ARCHIVE_ROOT, year, folder)
-        for d in (web_dir, thumb_dir, desk_dir, archive_dir):
-            os.makedirs(d, exist_ok=True)
-        web_path = os.path.join(web_dir, suggested_name)
-        thumb_path = os.path.join(thumb_dir, suggested_name)
-        desk_path = os.path.join(desk_dir, suggested_name)
-        archive_path = os.path.join(archive_dir, suggested_name)
-
-        # Copy original to archive before any modification!
-        shutil.copy2(orig_path, archive_path)
-
-        # Move working file to web_dir (for resizing and publishing)
-        shutil.move(orig_path, web_path)
-
-        # Resize/watermark/copy to all targets
-        resize_and_watermark(
-            web_path, web_path, thumb_path, desk_path,
-            WATERMARK_TEXT,
-            FONT_PATH
-        )
-
-        # *** UPDATE width and height after resizing ***
-        try:
-            im = Image.open(web_path)
-            width, height = im.size
-            self.field_vars['Width'].set(str(width))
-            self.field_vars['Height'].set(str(height))
-        except Exception as e:
-            print(f"Error reading new width/height: {e}")
-
-        # Save public URLs to local DB
-        web_url = f"https://your_domain.com/images/{year}/{folder}/{suggested_name}"
-        thumb_url = f"https://your_domain.com/images/{year}/thumbs/{folder}/{suggested_name}"
-        self.field_vars['Path'].set(web_url)
-        self.field_vars['Thumb_Path'].set(thumb_url)
-        self.save_current('Approved')
+        # The file work runs on the approval queue; the row sits in "Processing" until it's done.
+        img_info = self.queue.current
+        if self.processing():
+            return
+        with span("review.approve", file=img_info.File_Name):  # UI-side only; the file work is "approve"
+            self.save_current('Processing')
+            self.approvals.submit(approval_job(img_info))
+        self.update_approval_status()
         self.next_image()
 
+    def poll_approvals(self):
+        for job, updates, error in self.approvals.poll():
+            info = self.queue.find(job['id'])
+            if info:
+                info.update(updates)
+                info.Review_Status = 'Failed' if error else 'Approved'
+                if error:
+                    info.Path = job['current_path']
+            if error:
+                print(f"❌ Approval failed for {job['name']}: {error}")
+            if info is not None and info is self.queue.current:
+                self.update_position()
+                self.update_actions()
+        self.update_approval_status()
+        self.master.after(200, self.poll_approvals)
+
+    def update_approval_status(self):
+        text = f"Approvals in flight: {self.approvals.in_flight}"
+        if self.approvals.failures:
+            name, err = self.approvals.failures[-1]
+            text += f"  |  Failed: {len(self.approvals.failures)} (last: {name}: {err})"
+        self.approval_status.set(text)
+
     def reject(self):
-        img_info = self.images[self.idx]
-        orig_path = img_info.get("Path")
+        if self.processing():
+            return
+        img_info = self.queue.current
+        orig_path = img_info.Path
         if orig_path and os.path.exists(orig_path):
             shutil.move(orig_path, os.path.join(REJECTED_FOLDER, os.path.basename(orig_path)))
-        self.cur.execute(f"DELETE FROM {TABLE_NAME} WHERE id=?", (img_info['id'],))
-        self.conn.commit()
+        self.repo.delete([img_info.id])
+        self.queue.remove(img_info.id)
         self.next_image()
 
     def pending(self):
+        if self.processing():
+            return
         self.save_current('Pending')
         self.next_image()
 
     def publish(self):
+        if self.processing():
+            return
         self.save_current('Published')
         messagebox.showinfo("Publish", "Marked as Published. You can upload to MySQL & FTP now.")
         self.next_image()
 
     def next_image(self):
-        self.idx += 1
-        if self.idx < len(self.images):
+        if self.queue.next():
             self.load_image()
         else:
+            if self.approvals.in_flight:
+                self.approval_status.set(f"Finishing {self.approvals.in_flight} approval(s)...")
+                self.master.update_idletasks()
+            self.approvals.wait()
+            self.approvals.poll()
+            if self.approvals.failures:
+                messagebox.showwarning(
+                    "Approval failures",
+                    "\n".join(f"{name}: {err}" for name, err in self.approvals.failures)
+                    + "\n\nThese rows are marked Failed and were not approved."
+                )
             answer = messagebox.askyesno(
                 "Done!", "All images reviewed and renamed! Would you like to upload now?"
             )
@@ -238,8 +344,7 @@ class ReviewApp:
 
                 messagebox.showinfo("Upload Complete", result.stdout)
                 # Clean review_queue from uploaded rows for tidiness:
-                self.cur.execute(f"DELETE FROM {TABLE_NAME} WHERE Review_Status='Uploaded'")
-                self.conn.commit()
+                self.repo.delete_uploaded()
                 messagebox.showinfo("Done", "All images uploaded and queue cleaned!")
             else:
                 messagebox.showinfo("Done", "You may close this window now.")
@@ -250,8 +355,7 @@ class ReviewApp:
 
 
     def back(self):
-        if self.idx > 0:
-            self.idx -= 1
+        if self.queue.prev():
             self.load_image()
         else:
             messagebox.showinfo("Back", "This is the first image.")
@@ -265,8 +369,15 @@ def next_image(self):
     os._exit(0)  # <- This will force exit, guaranteed to return to prompt.
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Review queued images.")
+    parser.add_argument("--qc", nargs="+", choices=QC_BUCKETS, help="only show these QC_Status buckets (e.g. Top Low)")
+    parser.add_argument("--folder", help="only show this Folder")
+    parser.add_argument("--qr-min", type=float)
+    parser.add_argument("--qr-max", type=float)
+    parser.add_argument("--page-size", type=int, default=REVIEW_PAGE_SIZE)
+    args = parser.parse_args()
     root = Tk()
-    app = ReviewApp(root)
+    app = ReviewApp(root, args.page_size, args.qc, args.folder, args.qr_min, args.qr_max)
     root.mainloop()
     # (The below code will not normally be reached, but just in case)
     print("Exited cleanly!")
@@ -0,0 +1,176 @@
+"""upload() against SQLite stand-ins for the MySQL site table and the photos_info mirror.
+
+    python -m pytest tests        (or: python -m unittest discover tests)
+
+FTP is replaced by a pool that records what it was asked to send.
+"""
+import os
+import json
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+import db_uploader
+from utils import tracing
+from utils.repository import get_repository, PHOTO_FIELDS
+
+def create_photos_table(conn, constraints=""):
+    """photos_info as the site has it, without the unique key upload() adds."""
+    cols = ", ".join(PHOTO_FIELDS)
+    conn.execute(f"CREATE TABLE photos_info (id INTEGER PRIMARY KEY AUTOINCREMENT, {cols}{constraints})")
+    conn.commit()
+
+class FakePool:
+    def __init__(self, config, size=4):
+        self.sent = []
+        self.reconnects = 0
+
+    def store(self, local_file, remote_dir, name):
+        self.sent.append((remote_dir, name))
+
+    def remote_size(self, remote_dir, name):
+        return None
+
+    def close(self):
+        pass
+
+class UploadTest(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.mkdtemp()
+        os.chdir(self.tmp)  # UploadJournal and the score cache use paths under data/
+        self.patched = {name: getattr(db_uploader, name) for name in
+                        ("DB_PATH", "LOCAL_MIRROR_DB", "LOCAL_BASE", "LOG_FILE", "FOLDER_MAP_FILE", "FTPPool")}
+        db_uploader.DB_PATH = os.path.join(self.tmp, "review.db")
+        db_uploader.LOCAL_MIRROR_DB = os.path.join(self.tmp, "photos_info.db")
+        db_uploader.LOCAL_BASE = os.path.join(self.tmp, "photos")
+        db_uploader.LOG_FILE = os.path.join(self.tmp, "upload_errors.log")
+        db_uploader.FOLDER_MAP_FILE = os.path.join(self.tmp, "folder_map.json")
+        self.pools = []
+        db_uploader.FTPPool = lambda config, size=4: self.pools.append(FakePool(config, size)) or self.pools[-1]
+        db_uploader.load_folder_map.cache_clear()
+        with open(db_uploader.FOLDER_MAP_FILE, "w", encoding="utf-8") as f:
+            json.dump({"birds": "Birds"}, f)
+        self.trace_enabled, tracing.ENABLED = tracing.ENABLED, False
+        self.repo = get_repository(db_uploader.DB_PATH)
+        self.remote = sqlite3.connect(":memory:")
+        create_photos_table(self.remote, ", CHECK (ISO >= 0)")  # the "site" rejects a negative ISO
+
+    def tearDown(self):
+        self.remote.close()
+        self.repo.close()
+        for name, value in self.patched.items():
+            setattr(db_uploader, name, value)
+        db_uploader.load_folder_map.cache_clear()
+        tracing.ENABLED = self.trace_enabled
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def approve(self, *names, iso=100, focal=400):
+        rows = []
+        for name in names:
+            for sub in ("birds", os.path.join("thumbs", "birds")):
+                path = os.path.join(db_uploader.LOCAL_BASE, "2024", sub, name)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "wb") as f:
+                    f.write(name.encode("utf-8") * 10)
+            rows.append({"Folder": "Birds", "File_Name": name, "Path": f"https://example.com/{name}",
+                         "Thumb_Path": f"https://example.com/thumbs/{name}", "DateTime": "2024:05:01 10:00:00",
+                         "Width": 1600, "Height": 1067, "ISO": iso, "Focal_length": focal, "QR": 7.5,
+                         "QC_Status": "Top", "Original_File_Name": name, "Review_Status": "Approved"})
+        self.repo.insert_many(rows)
+
+    def upload(self, **kwargs):
+        return db_uploader.upload(conn_remote=self.remote, remote_dialect="sqlite", **kwargs)
+
+    def remote_rows(self):
+        return self.remote.execute("SELECT Folder, File_Name, ISO FROM photos_info ORDER BY File_Name").fetchall()
+
+    def mirror_rows(self):
+        conn = sqlite3.connect(db_uploader.LOCAL_MIRROR_DB)
+        try:
+            return conn.execute("SELECT Folder, File_Name, ISO FROM photos_info ORDER BY File_Name").fetchall()
+        finally:
+            conn.close()
+
+    def statuses(self):
+        return dict(self.repo.conn.execute("SELECT File_Name, Review_Status FROM review_queue").fetchall())
+
+    def test_publishes_approved_rows(self):
+        self.approve("a.jpg", "b.jpg")
+        self.assertEqual(self.upload(), (2, 0))
+        expected = [("Birds", "a.jpg", 100), ("Birds", "b.jpg", 100)]
+        self.assertEqual(self.remote_rows(), expected)
+        self.assertEqual(self.mirror_rows(), expected)
+        self.assertEqual(self.statuses(), {"a.jpg": "Uploaded", "b.jpg": "Uploaded"})
+        self.assertEqual(len(self.pools[0].sent), 4)  # image + thumb each
+
+    def test_rerunning_the_same_batch_adds_no_rows(self):
+        self.approve("a.jpg", "b.jpg")
+        self.upload()
+        # The same rows approved again, e.g. after the status flip was lost.
+        self.repo.conn.execute("UPDATE review_queue SET Review_Status = 'Approved'")
+        self.repo.conn.commit()
+        self.assertEqual(self.upload(), (2, 0))
+        self.assertEqual(self.upload(delta=False), (0, 0))  # nothing Approved is left
+        self.assertEqual(len(self.remote_rows()), 2)
+        self.assertEqual(len(self.mirror_rows()), 2)
+        self.assertEqual(len(self.pools[1].sent), 0)  # delta sync: files and metadata unchanged
+
+        self.repo.conn.execute("UPDATE review_queue SET Review_Status = 'Approved'")
+        self.repo.conn.commit()
+        self.assertEqual(self.upload(delta=False), (2, 0))  # a full re-send upserts in place
+        self.assertEqual(len(self.remote_rows()), 2)
+        self.assertEqual(len(self.mirror_rows()), 2)
+
+    def test_bad_row_does_not_sink_its_chunk(self):
+        self.approve("a.jpg", "c.jpg")
+        self.approve("b.jpg", iso=-1)
+        self.assertEqual(self.upload(chunk_size=10), (2, 1))
+        self.assertEqual(self.remote_rows(), [("Birds", "a.jpg", 100), ("Birds", "c.jpg", 100)])
+        self.assertEqual(self.mirror_rows(), [("Birds", "a.jpg", 100), ("Birds", "c.jpg", 100)])
+        self.assertEqual(self.statuses(), {"a.jpg": "Uploaded", "b.jpg": "Approved", "c.jpg": "Uploaded"})
+        with open(db_uploader.LOG_FILE, encoding="utf-8") as log:
+            self.assertIn("b.jpg", log.read())
+
+    def test_mirror_failure_keeps_the_row_approved(self):
+        mirror = sqlite3.connect(db_uploader.LOCAL_MIRROR_DB)
+        create_photos_table(mirror, ", CHECK (Focal_length > 0)")  # the remote accepts it, the mirror doesn't
+        mirror.close()
+        self.approve("a.jpg", "c.jpg")
+        self.approve("b.jpg", focal=0)
+        self.assertEqual(self.upload(chunk_size=10), (2, 1))
+        self.assertEqual(self.mirror_rows(), [("Birds", "a.jpg", 100), ("Birds", "c.jpg", 100)])
+        self.assertEqual(self.statuses(), {"a.jpg": "Uploaded", "b.jpg": "Approved", "c.jpg": "Uploaded"})
+        self.assertEqual(len(self.remote_rows()), 3)  # committed before the mirror failed; re-runs upsert it
+
+    def test_status_flip_failure_is_counted_not_raised(self):
+        def locked(ids, status):
+            raise sqlite3.OperationalError("database is locked")
+        self.approve("a.jpg", "b.jpg")
+        self.repo.set_status = locked
+        self.assertEqual(self.upload(chunk_size=10), (0, 2))
+        del self.repo.set_status
+        self.assertEqual(self.statuses(), {"a.jpg": "Approved", "b.jpg": "Approved"})
+        self.assertEqual(self.upload(chunk_size=10), (2, 0))  # the journal and mirror were released
+        self.assertEqual(len(self.remote_rows()), 2)
+
+    def test_duplicate_folder_file_rows_collapse(self):
+        params = ("Birds", "a.jpg", "old", "", "2024:05:01", "", "", 1, 1, "", "", 50, 1, "", "", "", 1.0, "Low", "a.jpg")
+        marks = ", ".join(["?"] * len(PHOTO_FIELDS))
+        insert = f"INSERT INTO photos_info ({', '.join(PHOTO_FIELDS)}) VALUES ({marks})"
+        mirror = sqlite3.connect(db_uploader.LOCAL_MIRROR_DB)
+        create_photos_table(mirror)
+        for conn in (self.remote, mirror):
+            conn.executemany(insert, [params, params])
+            conn.commit()
+        mirror.close()
+
+        self.approve("a.jpg")
+        self.assertEqual(self.upload(), (1, 0))
+        self.assertEqual(self.remote_rows(), [("Birds", "a.jpg", 100)])
+        self.assertEqual(self.mirror_rows(), [("Birds", "a.jpg", 100)])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+"""Approval processing (archive copy, move, render) on a background job queue.
+
+The review window marks a row "Processing" and moves on; a worker thread does the file
+work and then flips the row to "Approved" (or "Failed", keeping Path pointed at wherever
+the working file ended up so nothing is lost).
+
+process_approval can be re-run on a Processing/Failed row (python -m pipeline render): an
+existing archive copy is never overwritten and the outputs are always rendered from it, so
+a web file that was already watermarked is not archived or watermarked again.
+"""
+import os
+import queue
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.repository import get_repository
+from utils.renderer import render_outputs
+from utils.tracing import span, file_size
+
+APPROVAL_WORKERS = 2
+LOCAL_BASE = r"C:\Users\YOUR_USERNAME\images"
+DESKTOP_ROOT = r"C:\Users\YOUR_USERNAME\Desktop\photos"
+ARCHIVE_ROOT = r"C:\Users\YOUR_USERNAME\Pictures"
+SITE_URL = "https://your_domain.com/images"
+
+def approval_paths(year, folder, name, local_base, desktop_root, archive_root):
+    return {
+        "web": os.path.join(local_base, year, folder, name),
+        "thumb": os.path.join(local_base, year, "thumbs", folder, name),
+        "desk": os.path.join(desktop_root, folder, name),
+        "archive": os.path.join(archive_root, year, folder, name),
+    }
+
+def approval_job(row):
+    """The ApprovalQueue job for a review_queue row (Folder/File_Name as saved on the row)."""
+    year = row.DateTime[:4] if row.DateTime else "unknown"
+    folder, name = row.Folder, row.File_Name
+    return {
+        "id": row.id,
+        "name": name,
+        "orig_path": row.Path,
+        "paths": approval_paths(year, folder, name, LOCAL_BASE, DESKTOP_ROOT, ARCHIVE_ROOT),
+        # Public URLs stored in the local DB once the files are in place
+        "web_url": f"{SITE_URL}/{year}/{folder}/{name}",
+        "thumb_url": f"{SITE_URL}/{year}/thumbs/{folder}/{name}",
+    }
+
+def process_approval(job):
+    """Do the file work for one approval. Returns (width, height) of the web image.
+
+    job keys: orig_path, paths (from approval_paths).
+    job["current_path"] is kept up to date so a failure can report where the file is.
+    """
+    paths = job["paths"]
+    for p in paths.values():
+        os.makedirs(os.path.dirname(p), exist_ok=True)
+
+    # Copy original to archive before any modification! A copy from an earlier attempt is
+    # the pristine one; the working file may already be watermarked by now.
+    if not os.path.exists(paths["archive"]):
+        with span("approve.archive", file=job.get("name")) as s:
+            shutil.copy2(job["orig_path"], paths["archive"])
+            s["bytes_out"] = file_size(paths["archive"])
+
+    # Move working file to web_dir (for resizing and publishing), unless an earlier attempt did
+    if os.path.abspath(job["orig_path"]) != os.path.abspath(paths["web"]) and os.path.exists(job["orig_path"]):
+        shutil.move(job["orig_path"], paths["web"])
+    job["current_path"] = paths["web"]
+
+    # Resize/watermark/copy to all targets from the archive copy, so a re-run never stacks a
+    # second watermark; the renderer reports the sizes it produced.
+    with span("approve.render", file=job.get("name"), bytes_in=file_size(paths["archive"])) as s:
+        sizes = render_outputs(paths["archive"], paths["web"], paths["thumb"], paths["desk"])
+        s["bytes_out"] = sum(file_size(paths[k]) or 0 for k in ("web", "thumb", "desk"))
+    return sizes["web"]
+
+class ApprovalQueue:
+    """Runs process_approval jobs on a small thread pool and reports results back to the UI.
+
+    The UI thread calls poll() (e.g. from Tk's after()) to collect finished jobs; workers
+    never touch widgets.
+    """
+
+    def __init__(self, db_path, workers=APPROVAL_WORKERS):
+        self.repo = get_repository(db_path)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="approval")
+        self.finished = queue.Queue()
+        self.failures = []
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    @property
+    def in_flight(self):
+        with self._lock:
+            return self._in_flight
+
+    def submit(self, job):
+        """job: as for process_approval, plus id, name, web_url, thumb_url."""
+        with self._lock:
+            self._in_flight += 1
+        job.setdefault("current_path", job["orig_path"])
+        self.executor.submit(self._run, job)
+
+    def _run(self, job):
+        error = None
+        updates = {}
+        try:
+            with span("approve", file=job["name"], bytes_in=file_size(job["orig_path"])):
+                width, height = process_approval(job)
+            updates = {"Width": width, "Height": height,
+                       "Path": job["web_url"], "Thumb_Path": job["thumb_url"]}
+            self.repo.update(job["id"], updates, "Approved")
+        except Exception as e:
+            error = e
+            try:
+                self.repo.update(job["id"], {"Path": job["current_path"]}, "Failed")
+            except Exception as db_error:
+                print(f"❌ Could not record failed approval for {job['name']}: {db_error}")
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            self.finished.put((job, updates, error))
+
+    def poll(self):
+        """Return [(job, updates, error)] finished since the last call."""
+        done = []
+        while True:
+            try:
+                job, updates, error = self.finished.get_nowait()
+            except queue.Empty:
+                return done
+            if error is not None:
+                self.failures.append((job["name"], str(error)))
+            done.append((job, updates, error))
+
+    def wait(self):
+        """Block until every submitted approval has finished."""
+        self.executor.shutdown(wait=True)
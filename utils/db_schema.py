@@ -0,0 +1,127 @@
+"""Schema, indexes and connection settings for data/review.db.
+
+This module is the one place review_queue is defined. Migrations are numbered and
+applied in order; the number of the last one applied lives in PRAGMA user_version,
+so opening a database from any older version (created by init_db.py, build_table.py
+or main.py's old inline CREATE TABLE) brings it up to date.
+
+connect() also switches the file to WAL and sets a busy timeout, so the scorer,
+review editor and uploader can read while another process writes instead of failing
+with "database is locked".
+"""
+import os
+import sqlite3
+
+DB_PATH = "data/review.db"
+TABLE_NAME = "review_queue"
+BUSY_TIMEOUT_MS = 10000
+CACHE_SIZE_KB = 20000
+
+# Migration 1's columns, as shipped. Later columns are added by their own migration below.
+V1_COLUMNS = [
+    ("Folder", "TEXT"), ("File_Name", "TEXT"), ("Path", "TEXT"), ("Thumb_Path", "TEXT"),
+    ("DateTime", "TEXT"), ("Camera", "TEXT"), ("Lens_model", "TEXT"),
+    ("Width", "INTEGER"), ("Height", "INTEGER"), ("Exposure", "TEXT"), ("Aperture", "TEXT"),
+    ("ISO", "INTEGER"), ("Focal_length", "INTEGER"), ("Keywords", "TEXT"), ("Caption", "TEXT"),
+    ("Location", "TEXT"), ("Subject", "TEXT"),
+    ("nima_score", "REAL"), ("blur_score", "REAL"), ("brightness_score", "REAL"), ("contrast_score", "REAL"),
+    ("QR", "REAL"), ("QC_Status", "TEXT"), ("Review_Status", "TEXT"),
+    ("Original_File_Name", "TEXT"), ("Score_State", "TEXT"),
+]
+DUPLICATE_COLUMNS = [("dhash", "TEXT"), ("Dup_Group", "TEXT"), ("Dup_Of", "TEXT")]   # migration 3
+EXTRA_SCORE_COLUMNS = [("Extra_Scores", "TEXT")]                                      # migration 4
+CONTENT_HASH_COLUMNS = [("Content_Hash", "TEXT")]                                     # migration 5
+
+# The current table, in column order (ReviewRow in utils/repository.py follows it).
+REVIEW_COLUMNS = V1_COLUMNS + DUPLICATE_COLUMNS + EXTRA_SCORE_COLUMNS + CONTENT_HASH_COLUMNS
+
+def _add_columns(conn, columns):
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({TABLE_NAME})")}
+    for name, kind in columns:
+        if name not in existing:
+            conn.execute(f"ALTER TABLE {TABLE_NAME} ADD COLUMN {name} {kind}")
+
+def _create_review_queue(conn):
+    # Tables made by main.py's old inline CREATE lack the score columns (and declare QR
+    # INTEGER, which still stores fractional QRs as REAL), so add whatever is missing.
+    cols = ",\n    ".join(f"{name} {kind}" for name, kind in V1_COLUMNS)
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {TABLE_NAME} (\n"
+                 f"    id INTEGER PRIMARY KEY AUTOINCREMENT,\n    {cols}\n)")
+    _add_columns(conn, V1_COLUMNS)
+
+def _add_indexes(conn):
+    t = TABLE_NAME
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{t}_review_status ON {t} (Review_Status)")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{t}_qc_status ON {t} (QC_Status, QR)")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{t}_qr ON {t} (QR)")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{t}_folder ON {t} (Folder)")
+    # Partial indexes matching the hot WHERE clauses exactly, so SQLite can use them:
+    # the review queue (everything not yet uploaded), the uploader (Approved rows)
+    # and the scorer (rows without a QR/QC_Status yet).
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{t}_to_review ON {t} (id) "
+                 f"WHERE (Review_Status IS NULL OR Review_Status != 'Uploaded')")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{t}_approved ON {t} (id) WHERE Review_Status = 'Approved'")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{t}_unscored ON {t} (id) WHERE (QR IS NULL OR QC_Status IS NULL)")
+
+def _add_duplicate_columns(conn):
+    _add_columns(conn, DUPLICATE_COLUMNS)
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABLE_NAME}_dup_group ON {TABLE_NAME} (Dup_Group)")
+
+def _add_extra_scores(conn):
+    _add_columns(conn, EXTRA_SCORE_COLUMNS)  # JSON, utils/metric_registry.py
+
+def _add_content_hash(conn):
+    _add_columns(conn, CONTENT_HASH_COLUMNS)  # key into utils/preview_store.py
+
+# Append only: never edit or reorder a migration that has shipped.
+MIGRATIONS = [
+    _create_review_queue,   # 1: review_queue with V1_COLUMNS
+    _add_indexes,           # 2: status / score / folder indexes
+    _add_duplicate_columns, # 3: perceptual hash + duplicate grouping (utils/phash.py)
+    _add_extra_scores,      # 4: scores of metrics without a column of their own
+    _add_content_hash,      # 5: SHA-256 of the image, for the preview store and score cache
+]
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn):
+    """Apply the migrations this database hasn't seen yet. Returns the new version."""
+    version = schema_version(conn)
+    if version >= len(MIGRATIONS):
+        return version
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        # Re-read under the write lock in case another process migrated meanwhile.
+        version = schema_version(conn)
+        for number, step in enumerate(MIGRATIONS[version:], start=version + 1):
+            step(conn)
+            conn.execute(f"PRAGMA user_version = {number}")
+    conn.execute("PRAGMA optimize")
+    return len(MIGRATIONS)
+
+def configure(conn):
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")   # safe with WAL; no fsync per commit
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KB}")
+    return conn
+
+def connect(path=DB_PATH, migrate_schema=True, **kwargs):
+    """sqlite3.connect() with the shared pragmas; migrates review_queue unless told not to
+    (e.g. for the photos_info mirror, which just wants the pragmas)."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = configure(sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000, **kwargs))
+    if migrate_schema:
+        migrate(conn)
+    return conn
+
+def reset(path=DB_PATH):
+    """Drop review_queue and rebuild it (and its indexes) from the migrations."""
+    conn = connect(path, migrate_schema=False)
+    with conn:
+        conn.execute(f"DROP TABLE IF EXISTS {TABLE_NAME}")
+        conn.execute("PRAGMA user_version = 0")
+    migrate(conn)
+    return conn
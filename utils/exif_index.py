@@ -0,0 +1,169 @@
+"""Persistent EXIF index, so each image's header is parsed once.
+
+Entries are keyed on (file name, size, mtime_ns) rather than the full path. Moving a file
+into the incoming folder keeps all three, so a file indexed where it was selected is
+still a hit after the move, and re-opening a folder skips what is already known.
+
+Parsing only reads the header: PIL's Image.open() doesn't decode pixels, and getexif()
+plus the Exif sub-IFD give the same {tag name: value} dict that file_namer.get_exif_data
+builds. get_camera_model / get_exif_year then run on that dict instead of re-opening
+the file.
+
+Warm the index ahead of an ingest with:
+
+    python -m utils.exif_index FOLDER_OR_FILE... [--workers 8]
+"""
+import os
+import json
+import time
+import sqlite3
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ExifTags
+
+INDEX_DB = "data/exif_index.db"
+INDEX_WORKERS = 8
+IMAGE_EXTENSIONS = (".jpg", ".jpeg")
+EXIF_IFD = 0x8769
+
+def file_key(path):
+    st = os.stat(path)
+    return os.path.basename(path), st.st_size, st.st_mtime_ns
+
+def _json_value(value):
+    if isinstance(value, bytes):
+        return None  # maker notes, thumbnails: nothing the helpers use
+    if isinstance(value, tuple):
+        return [_json_value(v) for v in value]
+    if isinstance(value, (int, float, str)) or value is None:
+        return value
+    try:
+        return float(value)  # IFDRational
+    except (TypeError, ValueError, ZeroDivisionError):
+        return str(value)
+
+def read_exif(path):
+    """{tag name: value} from the header of `path`, plus _width/_height. No pixel decode."""
+    with Image.open(path) as im:
+        exif = im.getexif()
+        tags = dict(exif)
+        tags.update(exif.get_ifd(EXIF_IFD))
+        width, height = im.size
+    data = {}
+    for tag, value in tags.items():
+        value = _json_value(value)
+        if value is not None:
+            data[ExifTags.TAGS.get(tag, str(tag))] = value
+    data["_width"], data["_height"] = width, height
+    return data
+
+class ExifIndex:
+    """Shared by the ingest threads; every database access goes through the lock."""
+
+    def __init__(self, path=INDEX_DB):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.parsed = 0
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("""CREATE TABLE IF NOT EXISTS exif (
+                name TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                data TEXT NOT NULL,
+                indexed REAL NOT NULL,
+                PRIMARY KEY (name, size, mtime_ns)
+            )""")
+
+    def _lookup(self, key):
+        with self.lock:
+            row = self.conn.execute("SELECT data FROM exif WHERE name=? AND size=? AND mtime_ns=?", key).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _store_many(self, entries):
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO exif (name, size, mtime_ns, data, indexed) VALUES (?, ?, ?, ?, ?)",
+                                  [key + (json.dumps(data), now) for key, data in entries])
+
+    def get(self, path):
+        """Parsed EXIF for `path`, from the index when the file hasn't changed."""
+        key = file_key(path)
+        data = self._lookup(key)
+        if data is not None:
+            self.hits += 1
+            return data
+        data = read_exif(path)
+        self._store_many([(key, data)])
+        self.parsed += 1
+        return data
+
+    def index_paths(self, paths, workers=INDEX_WORKERS):
+        """Parse every path not yet indexed (one transaction at the end). Returns (new, known, failed)."""
+        todo, known, failed = [], 0, []
+        for path in paths:
+            try:
+                key = file_key(path)
+            except OSError as e:
+                failed.append(f"{path}: {e}")  # e.g. moved away by an ingest meanwhile
+                continue
+            if self._lookup(key) is None:
+                todo.append((key, path))
+            else:
+                known += 1
+
+        def parse(item):
+            key, path = item
+            try:
+                return key, read_exif(path), None
+            except Exception as e:
+                return key, None, f"{path}: {e}"
+
+        entries = []
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for key, data, error in pool.map(parse, todo):
+                if error:
+                    failed.append(error)
+                else:
+                    entries.append((key, data))
+        if entries:
+            self._store_many(entries)
+        self.parsed += len(entries)
+        return len(entries), known, failed
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+def find_images(targets):
+    for target in targets:
+        if os.path.isdir(target):
+            for root, _, files in os.walk(target):
+                for name in sorted(files):
+                    if name.lower().endswith(IMAGE_EXTENSIONS):
+                        yield os.path.join(root, name)
+        else:
+            yield target
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-index EXIF for folders/files ahead of an ingest.")
+    parser.add_argument("targets", nargs="+", help="folders (searched recursively) or image files")
+    parser.add_argument("--workers", type=int, default=INDEX_WORKERS)
+    parser.add_argument("--db", default=INDEX_DB)
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    index = ExifIndex(args.db)
+    new, known, failed = index.index_paths(list(find_images(args.targets)), max(1, args.workers))
+    index.close()
+    for error in failed:
+        print(f"❌ {error}")
+    print(f"✅ Indexed {new} new file(s), {known} already indexed, {len(failed)} failed "
+          f"in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
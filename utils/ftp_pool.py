@@ -0,0 +1,141 @@
+"""A small pool of FTP sessions for parallel uploads.
+
+Sessions are opened lazily up to `size`, remote directories that are known to exist
+are cached across sessions (so `images/<year>/<folder>` is walked once per run, not
+once per file), and a session that drops mid-transfer is replaced and the transfer
+retried.
+"""
+import queue
+import ftplib
+import posixpath
+import threading
+
+# Errors that mean "this session is dead", as opposed to error_perm (a real refusal).
+_CONNECTION_ERRORS = (OSError, EOFError, ftplib.error_temp, ftplib.error_reply, ftplib.error_proto)
+# OSErrors about local files: the session is fine, so it goes back to the pool and nothing is retried.
+_LOCAL_ERRORS = (FileNotFoundError, PermissionError, IsADirectoryError, NotADirectoryError)
+
+def remote_path(*parts):
+    """Join remote path parts into a normalised absolute path ("public_html/images/" + "/2024" -> "/public_html/images/2024")."""
+    return posixpath.normpath("/" + "/".join(p.strip("/") for p in parts if p and p.strip("/")))
+
+class FTPPool:
+    def __init__(self, config, size=4, retries=2, timeout=60):
+        self.config = config
+        self.size = size
+        self.retries = retries
+        self.timeout = timeout
+        self.reconnects = 0
+        self._idle = queue.Queue()
+        self._opened = 0
+        self._lock = threading.Lock()
+        self._known_dirs = {"/"}
+
+    def _connect(self):
+        ftp = ftplib.FTP()
+        ftp.connect(self.config["host"], self.config["port"], timeout=self.timeout)
+        ftp.login(self.config["user"], self.config["passwd"])
+        return ftp
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            can_open = self._opened < self.size
+            if can_open:
+                self._opened += 1
+        if not can_open:
+            return self._idle.get()
+        try:
+            return self._connect()
+        except Exception:
+            with self._lock:
+                self._opened -= 1
+            raise
+
+    def _discard(self, ftp):
+        try:
+            ftp.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._opened -= 1
+
+    def run(self, action):
+        """Call action(ftp) on a pooled session, reconnecting and retrying if the session drops."""
+        for attempt in range(self.retries + 1):
+            ftp = self._acquire()
+            try:
+                result = action(ftp)
+            except (ftplib.error_perm, *_LOCAL_ERRORS):
+                self._idle.put(ftp)
+                raise
+            except _CONNECTION_ERRORS:
+                self._discard(ftp)
+                if attempt == self.retries:
+                    raise
+                self.reconnects += 1
+                continue
+            except Exception:
+                self._idle.put(ftp)
+                raise
+            self._idle.put(ftp)
+            return result
+
+    def ensure_dir(self, ftp, remote_dir):
+        """mkdir -p for an absolute remote path, skipping every prefix already known to exist."""
+        path = remote_path(remote_dir)
+        if path in self._known_dirs:
+            return
+        prefix = ""
+        for part in path.strip("/").split("/"):
+            prefix += "/" + part
+            if prefix in self._known_dirs:
+                continue
+            try:
+                ftp.mkd(prefix)
+            except ftplib.error_perm:
+                pass  # already exists; a real permission problem surfaces on STOR
+            with self._lock:
+                self._known_dirs.add(prefix)
+
+    def store(self, local_file, remote_dir, name):
+        target = remote_path(remote_dir, name)
+
+        def upload(ftp):
+            self.ensure_dir(ftp, remote_dir)
+            f.seek(0)  # a retry starts the file over
+            ftp.storbinary("STOR " + target, f)
+            return target
+
+        # Opened before any session is taken, so a missing/unreadable file isn't mistaken for a dropped connection.
+        with open(local_file, "rb") as f:
+            return self.run(upload)
+
+    def remote_size(self, remote_dir, name):
+        """Size of a remote file in bytes, or None if it doesn't exist."""
+        target = remote_path(remote_dir, name)
+
+        def size(ftp):
+            ftp.voidcmd("TYPE I")  # SIZE is only reliable in binary mode
+            try:
+                return ftp.size(target)
+            except ftplib.error_perm:
+                return None
+
+        return self.run(size)
+
+    def close(self):
+        while True:
+            try:
+                ftp = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                ftp.quit()
+            except Exception:
+                ftp.close()
+            with self._lock:
+                self._opened -= 1
@@ -0,0 +1,160 @@
+"""Staged ingestion of selected images into review_queue.
+
+Stage A (thread pool): move into the incoming folder and read EXIF (via the EXIF index,
+so files parsed before - or pre-indexed with `python -m utils.exif_index` - aren't re-read).
+Destination names are reserved in the caller thread first, so two selected files with the
+same basename (e.g. from two camera cards) can't race for one incoming path, and a file already
+in the incoming folder under that name is never taken for the new one.
+Stage B (caller thread, input order): generate the filename, so names stay deterministic.
+Stage C (thread pool): build the metadata row, the preview store entry (utils/preview_store.py)
+and the perceptual hash (taken from the stored scoring image, not the original).
+Stage D (caller thread): group near-duplicates (utils.phash.DuplicateIndex), then executemany inserts - one transaction for the whole batch, or one per
+`chunk_size` rows when the caller streams rows to the scorer as they land.
+"""
+import os
+import shutil
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import phash, preview_store
+from utils.tracing import span
+from utils.repository import get_repository
+from utils.exif_index import ExifIndex
+from utils.file_namer import get_camera_model, get_exif_year, generate_unique_filename
+from utils.metadata_builder import build_metadata
+
+INGEST_WORKERS = 8
+
+def _same_path(a, b):
+    return os.path.normcase(os.path.abspath(a)) == os.path.normcase(os.path.abspath(b))
+
+def _incoming_path(src, incoming_dir, reserved):
+    """Incoming path for `src`. A name another file of this batch already took, or a file already in
+    the incoming folder (camera names repeat across cards), gets a _2, _3... suffix instead."""
+    stem, ext = os.path.splitext(os.path.basename(src))
+    name, n = stem + ext, 1
+    while True:
+        path = os.path.join(incoming_dir, name)
+        taken = os.path.normcase(name) in reserved or (os.path.exists(path) and not _same_path(src, path))
+        if not taken:
+            break
+        n += 1
+        name = f"{stem}_{n}{ext}"
+    reserved.add(os.path.normcase(name))
+    return path
+
+def _stage_file(src, incoming_path, exif_index):
+    original_name = os.path.basename(src)
+    with span("ingest.move", file=original_name):
+        if not _same_path(src, incoming_path):  # already in the incoming folder otherwise
+            shutil.move(src, incoming_path)
+        exif = exif_index.get(incoming_path)
+    return original_name, incoming_path, get_camera_model(exif), get_exif_year(exif)
+
+def _build_row(staged, suggested_name, subj, loc, fld):
+    original_name, incoming_path, cam, year = staged
+    with span("ingest.metadata", file=original_name):
+        meta = build_metadata(incoming_path, "", suggested_name, fld, year, loc, subj)
+    meta["Review_Status"] = "Pending"
+    meta["Original_File_Name"] = original_name
+    meta["Path"] = incoming_path
+    meta["Thumb_Path"] = ""
+    meta["Score_State"] = "Queued"
+    try:
+        with span("ingest.preview", file=original_name, bytes_in=os.path.getsize(incoming_path)):
+            meta["Content_Hash"] = preview_store.ensure(incoming_path)
+    except Exception as e:
+        print(f"⚠️ No preview for {original_name}: {e}")
+    try:
+        meta["dhash"] = phash.dhash(preview_store.lookup(meta.get("Content_Hash"), "scoring") or incoming_path)
+    except Exception as e:
+        print(f"⚠️ No perceptual hash for {original_name}: {e}")
+    return meta
+
+def ingest_images(images, subj, loc, fld, incoming_dir, db_path,
+                  workers=INGEST_WORKERS, progress=None, chunk_size=None, on_inserted=None):
+    """Move, parse and insert `images`. Returns (inserted, failures) where failures is [(src, error)].
+
+    `progress(stage, done, total)` is called from the ingesting thread after every file.
+    With `chunk_size`, rows are committed in chunks as soon as they are built (in
+    selection order) and `on_inserted(count)` is called after each commit.
+    """
+    def report(stage, done):
+        if progress:
+            progress(stage, done, len(images))
+
+    os.makedirs(incoming_dir, exist_ok=True)
+    failures = []
+    pending_rows = []
+    row_futures = deque()
+    counts = {"built": 0, "inserted": 0}
+    repo = get_repository(db_path)
+    exif_index = ExifIndex()
+    duplicates = phash.DuplicateIndex(repo)
+
+    def flush():
+        if not pending_rows:
+            return
+        with span("ingest.insert", items=len(pending_rows)):
+            for meta in pending_rows:
+                duplicates.assign(meta)
+            repo.insert_many(pending_rows)
+        counts["inserted"] += len(pending_rows)
+        if on_inserted:
+            on_inserted(len(pending_rows))
+        pending_rows.clear()
+
+    def drain(block):
+        while row_futures and (block or row_futures[0][1].done()):
+            src, future = row_futures.popleft()
+            try:
+                pending_rows.append(future.result())
+            except Exception as e:
+                failures.append((src, str(e)))
+            counts["built"] += 1
+            report("Building metadata", counts["built"])
+            if chunk_size and len(pending_rows) >= chunk_size:
+                flush()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # Only keep a couple of moves per worker queued so metadata jobs for the
+        # first files aren't stuck behind the moves of the whole selection.
+        sources = iter(images)
+        reserved = set()
+        staged_futures = deque()
+        for src in sources:
+            staged_futures.append((src, pool.submit(_stage_file, src, _incoming_path(src, incoming_dir, reserved),
+                                                    exif_index)))
+            if len(staged_futures) >= workers * 2:
+                break
+        done = 0
+        while staged_futures:
+            src, future = staged_futures.popleft()
+            next_src = next(sources, None)
+            if next_src is not None:
+                staged_futures.append((next_src, pool.submit(
+                    _stage_file, next_src, _incoming_path(next_src, incoming_dir, reserved), exif_index)))
+            done += 1
+            try:
+                staged = future.result()
+                _, _, cam, year = staged
+                suggested_name = generate_unique_filename(subj, loc, fld, cam, year)
+                row_futures.append((src, pool.submit(_build_row, staged, suggested_name, subj, loc, fld)))
+            except Exception as e:
+                failures.append((src, str(e)))
+                counts["built"] += 1
+            report("Reading EXIF", done)
+            drain(block=False)
+        drain(block=True)
+    flush()
+    exif_index.close()
+    if exif_index.hits:
+        print(f"EXIF index: {exif_index.hits} file(s) already indexed, {exif_index.parsed} parsed.")
+    removed, freed = preview_store.prune()
+    if removed:
+        print(f"Preview store: pruned {removed} least recently used file(s) ({freed / 1_048_576:.1f} MB).")
+    if duplicates.grouped or duplicates.published_hits:
+        print(f"Near-duplicates: {duplicates.grouped} grouped with an earlier frame, "
+              f"{duplicates.published_hits} match an already published photo (see Dup_Of).")
+    report("Inserted", len(images))
+    return counts["inserted"], failures
@@ -0,0 +1,222 @@
+"""The quality metrics QR can be built from, what each one needs, and what it costs.
+
+Every metric declares its input:
+
+    pixels - the NIMA_INPUT_SIZE RGB batch (short edge scaled, centre-cropped), stacked into
+             one tensor per batch and shared by every pixel metric; these are pyiqa models run
+             in the scoring process
+    luma   - the working-size grey frame (utils.quality_metrics.LumaFrame), built once per
+             image in the decode workers
+    exif   - header tags only (utils.exif_index.read_exif), no pixel decode
+
+and a rough per-image cost in ms (CPU). QR is the weighted sum of the metrics' 0-10 scores
+with the weights from config.yaml:
+
+    scoring:
+      weights: {nima: 0.6, blur: 0.2, brightness: 0.1, contrast: 0.1}
+
+Only metrics with a non-zero weight are computed, and an input nobody needs isn't built
+(no weighted pixel metric = no model, no resize). Metrics with a review_queue column of
+their own fill it; the others are kept as JSON in Extra_Scores.
+
+MetricStats collects per-metric latencies and, for every scored row, whether leaving a
+metric out would have changed QC_Status, so expensive metrics that never matter can be
+dropped from the weights.
+"""
+import os
+import json
+import math
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+
+import yaml
+
+CONFIG_FILE = "config.yaml"
+STATS_LOG = os.path.join("data", "metric_stats.jsonl")
+DEFAULT_WEIGHTS = {"nima": 0.6, "blur": 0.2, "brightness": 0.1, "contrast": 0.1}
+INPUTS = ("pixels", "luma", "exif")
+HISTOGRAM_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+@dataclass(frozen=True, slots=True)
+class Metric:
+    name: str
+    input: str
+    cost: float
+    score: object          # raw value -> 0..10
+    raw: object = None     # luma/exif: fn(input) -> raw value; pixels: the pyiqa metric `name`
+    column: str = None     # review_queue score column, or None for Extra_Scores
+    ceiling: float = None  # pixels: the best raw value it can return (cascade scoring's upper bound)
+
+METRICS = {}
+
+def register(metric):
+    if metric.input not in INPUTS:
+        raise ValueError(f"{metric.name}: input must be one of {', '.join(INPUTS)}")
+    METRICS[metric.name] = metric
+    return metric
+
+def _clamp(value):
+    return max(0.0, min(value, 10.0))
+
+def _iso(exif):
+    iso = exif.get("ISOSpeedRatings") or exif.get("PhotographicSensitivity")
+    if isinstance(iso, list):
+        iso = iso[0] if iso else None
+    return float(iso) if iso else None
+
+register(Metric("nima", "pixels", 40.0, lambda raw: raw, column="nima_score", ceiling=10.0))
+register(Metric("musiq", "pixels", 150.0, lambda raw: _clamp(raw / 10.0), ceiling=100.0))
+register(Metric("brisque", "pixels", 30.0, lambda raw: _clamp((100.0 - raw) / 10.0), ceiling=0.0))
+register(Metric("blur", "luma", 3.0, lambda raw: min(raw / 200.0, 1.0) * 10,
+                raw=lambda frame: frame.blur(), column="blur_score"))
+register(Metric("brightness", "luma", 0.5, lambda raw: max(0, min(1 - abs((raw - 128) / 128), 1.0)) * 10,
+                raw=lambda frame: frame.mean_std[0], column="brightness_score"))
+register(Metric("contrast", "luma", 0.5, lambda raw: min(raw / 64.0, 1.0) * 10,
+                raw=lambda frame: frame.mean_std[1], column="contrast_score"))
+# High ISO as a noise proxy: 10 up to ISO 400, minus 2 per stop above; unknown counts as 5.
+register(Metric("iso", "exif", 0.1, lambda raw: 5.0 if raw is None else _clamp(10 - 2 * math.log2(max(raw, 400) / 400)),
+                raw=_iso))
+
+def load_weights(path=CONFIG_FILE):
+    """{metric: weight} from config.yaml `scoring.weights` (DEFAULT_WEIGHTS if not set), zero weights dropped.
+    Re-read whenever the file changes, so a long-lived worker picks up edits on its next run."""
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+    return _read_weights(path, mtime)
+
+@lru_cache(maxsize=4)
+def _read_weights(path, mtime):
+    try:
+        with open(path, encoding="utf-8") as f:
+            config = yaml.safe_load(f) or {}
+    except FileNotFoundError:
+        config = {}
+    weights = (config.get("scoring") or {}).get("weights") or DEFAULT_WEIGHTS
+    unknown = set(weights) - set(METRICS)
+    if unknown:
+        raise ValueError(f"Unknown metric(s) in scoring.weights: {', '.join(sorted(unknown))} "
+                         f"(known: {', '.join(METRICS)})")
+    weights = {name: float(w) for name, w in weights.items() if w}
+    if abs(sum(weights.values()) - 1.0) > 0.01:
+        print(f"⚠️ scoring.weights add up to {sum(weights.values()):.2f}, not 1; QR won't be on the 0-10 scale.")
+    return weights
+
+def active(weights, kind=None):
+    """Names of the weighted metrics (taking input `kind`, if given), cheapest first."""
+    names = [n for n in weights if kind is None or METRICS[n].input == kind]
+    return sorted(names, key=lambda n: METRICS[n].cost)
+
+def measure_inputs(names, frame=None, exif=None, timings=None):
+    """{name: raw value} for luma/exif metrics; adds per-metric seconds to `timings`."""
+    raw = {}
+    for name in names:
+        metric = METRICS[name]
+        started = time.perf_counter()
+        raw[name] = metric.raw(frame if metric.input == "luma" else exif)
+        if timings is not None:
+            timings[name] = time.perf_counter() - started
+    return raw
+
+def metric_scores(raw):
+    """{name: 0..10 score} for the metrics present in `raw`."""
+    return {name: METRICS[name].score(value) for name, value in raw.items()}
+
+def weighted_qr(scores, weights):
+    qr = 0.0
+    for name, weight in weights.items():
+        qr += scores[name] * weight
+    return qr
+
+_models = {}
+
+def model(name):
+    """pyiqa metric `name`, created on first use and kept for the life of the process (CPU)."""
+    if name not in _models:
+        import pyiqa
+        _models[name] = pyiqa.create_metric(name).cpu()
+    return _models[name]
+
+def loaded_models():
+    return list(_models)
+
+def run_pixel_metrics(names, pixel_batch, timings=None):
+    """{name: [raw per image]} for the pixel metrics, sharing one tensor for the batch.
+    Full frames of different sizes (NIMA_INPUT_SIZE = 0) don't stack and run one at a time."""
+    import numpy as np
+    import torch
+    if len({pixels.shape for pixels in pixel_batch}) == 1:
+        tensors = [torch.from_numpy(np.stack(pixel_batch)).permute(0, 3, 1, 2).float().div_(255.0)]
+    else:
+        tensors = [torch.from_numpy(np.ascontiguousarray(pixels)).permute(2, 0, 1)[None].float().div_(255.0)
+                   for pixels in pixel_batch]
+    results = {}
+    with torch.no_grad():
+        for name in names:
+            started = time.perf_counter()
+            results[name] = [float(s) for tensor in tensors for s in model(name)(tensor).flatten().tolist()]
+            if timings is not None:
+                timings[name] = time.perf_counter() - started
+    return results
+
+class MetricStats:
+    """Per-metric latency histograms and QC_Status impact for one scoring run."""
+
+    def __init__(self, weights):
+        self.weights = weights
+        self.samples = {}
+        self.rows = 0
+        self.qc_changes = {name: 0 for name in weights}
+
+    def add(self, timings, per=1):
+        """Record {name: seconds}; `per` images shared each measurement (pixel metrics run per batch)."""
+        for name, seconds in timings.items():
+            self.samples.setdefault(name, []).extend([seconds * 1000.0 / per] * per)
+
+    def observe(self, scores, qc_status):
+        """Count, per metric, whether dropping it (other weights scaled up) changes QC_Status."""
+        self.rows += 1
+        total = sum(self.weights.values())
+        qc = qc_status(round(weighted_qr(scores, self.weights), 2))
+        for name, weight in self.weights.items():
+            rest = total - weight
+            if rest <= 0:
+                continue
+            without = sum(scores[n] * w for n, w in self.weights.items() if n != name) * total / rest
+            if qc_status(round(without, 2)) != qc:
+                self.qc_changes[name] += 1
+
+    def summary(self):
+        lines = []
+        for name, samples in sorted(self.samples.items()):
+            ordered = sorted(samples)
+            p50 = ordered[len(ordered) // 2]
+            p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+            line = f"  {name:<11} n={len(ordered):<6} p50 {p50:7.1f} ms  p95 {p95:7.1f} ms"
+            if name in self.qc_changes and self.rows:
+                line += f"  QC_Status changes without it: {self.qc_changes[name]}/{self.rows}"
+            lines.append(line)
+        return "\n".join(lines)
+
+    def histogram(self, name):
+        """Counts per HISTOGRAM_MS bucket (upper bounds), plus one for slower samples."""
+        counts = [0] * (len(HISTOGRAM_MS) + 1)
+        for ms in self.samples.get(name, ()):
+            counts[next((i for i, bound in enumerate(HISTOGRAM_MS) if ms <= bound), len(HISTOGRAM_MS))] += 1
+        return counts
+
+    def write(self, path=STATS_LOG):
+        """Append this run as one JSON line."""
+        if not self.samples:
+            return
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        entry = {"time": time.strftime("%Y-%m-%d %H:%M:%S"), "weights": self.weights, "rows": self.rows,
+                 "buckets_ms": list(HISTOGRAM_MS),
+                 "metrics": {name: {"n": len(samples), "total_ms": round(sum(samples), 1),
+                                    "histogram": self.histogram(name),
+                                    "qc_changes": self.qc_changes.get(name)}
+                             for name, samples in self.samples.items()}}
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
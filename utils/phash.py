@@ -0,0 +1,120 @@
+"""Perceptual hashes (dHash) and near-duplicate grouping for ingest.
+
+A dHash is 64 bits: the image is shrunk to 9x8 grey pixels and each bit says whether a
+pixel is brighter than its right-hand neighbour. Burst frames and re-exports of the same
+photo land within a few bits of each other. Hashes are stored as 16 hex digits.
+
+DuplicateIndex keeps BK-trees (nearest neighbour by Hamming distance without comparing
+against every hash) of the rows still in review_queue and of the published photos in the
+photos_info mirror. Each new row gets:
+
+    Dup_Group - the group key (the dhash of the first frame seen) of the closest pending
+                row within GROUP_DISTANCE bits, or its own dhash if there is none
+    Dup_Of    - "Folder/File_Name" of a published photo within PUBLISHED_DISTANCE bits
+
+The scorer then runs NIMA on one frame per group (see batch_image_quality_score).
+"""
+import os
+import sqlite3
+
+from PIL import Image
+
+from utils.db_schema import TABLE_NAME
+
+HASH_SIZE = 8
+GROUP_DISTANCE = 6       # bits; burst frames / small crops
+PUBLISHED_DISTANCE = 4   # bits; stricter, since it flags the row as already published
+MIRROR_DB = "data/photos_info.db"
+MIRROR_TABLE = "photos_info"
+
+def dhash(path, size=HASH_SIZE):
+    with Image.open(path) as im:
+        im.draft("L", (size * 8, size * 8))  # JPEG: let libjpeg decode at 1/8 scale
+        small = im.convert("L").resize((size + 1, size), Image.BILINEAR)
+    pixels = list(small.getdata())
+    bits = 0
+    for row in range(size):
+        offset = row * (size + 1)
+        for col in range(size):
+            bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return f"{bits:0{size * size // 4}x}"
+
+def distance(a, b):
+    return (int(a, 16) ^ int(b, 16)).bit_count()
+
+class BKTree:
+    """Burkhard-Keller tree over hex hashes; each node carries a value."""
+
+    def __init__(self):
+        self.root = None   # [hash int, value, {distance: child}]
+        self.size = 0
+
+    def add(self, hex_hash, value):
+        h = int(hex_hash, 16)
+        self.size += 1
+        if self.root is None:
+            self.root = [h, value, {}]
+            return
+        node = self.root
+        while True:
+            d = (h ^ node[0]).bit_count()
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [h, value, {}]
+                return
+            node = child
+
+    def nearest(self, hex_hash, radius):
+        """(distance, value) of the closest entry within `radius`, or None."""
+        if self.root is None:
+            return None
+        h = int(hex_hash, 16)
+        best = None
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            d = (h ^ node[0]).bit_count()
+            if d <= radius and (best is None or d < best[0]):
+                best = (d, node[1])
+                radius = d  # only look for something closer from here on
+            for child_d, child in node[2].items():
+                if d - radius <= child_d <= d + radius:
+                    stack.append(child)
+        return best
+
+class DuplicateIndex:
+    def __init__(self, repo, mirror_path=MIRROR_DB):
+        self.pending = BKTree()
+        self.published = BKTree()
+        for hex_hash, group in repo.conn.execute(
+                f"SELECT dhash, Dup_Group FROM {TABLE_NAME} WHERE dhash IS NOT NULL "
+                "AND (Review_Status IS NULL OR Review_Status != 'Uploaded')"):
+            self.pending.add(hex_hash, group or hex_hash)
+        if os.path.exists(mirror_path):
+            conn = sqlite3.connect(mirror_path)
+            try:
+                for hex_hash, folder, name in conn.execute(
+                        f"SELECT dhash, Folder, File_Name FROM {MIRROR_TABLE} WHERE dhash IS NOT NULL"):
+                    self.published.add(hex_hash, f"{folder}/{name}")
+            except sqlite3.OperationalError:
+                pass  # mirror from before dhash was recorded
+            finally:
+                conn.close()
+        self.grouped = 0
+        self.published_hits = 0
+
+    def assign(self, meta):
+        """Set Dup_Group / Dup_Of on a metadata row that has a dhash (rows without one are left alone)."""
+        hex_hash = meta.get("dhash")
+        if not hex_hash:
+            return meta
+        match = self.pending.nearest(hex_hash, GROUP_DISTANCE)
+        if match:
+            self.grouped += 1
+        meta["Dup_Group"] = match[1] if match else hex_hash
+        self.pending.add(hex_hash, meta["Dup_Group"])
+        published = self.published.nearest(hex_hash, PUBLISHED_DISTANCE)
+        if published:
+            self.published_hits += 1
+            meta["Dup_Of"] = published[1]
+        return meta
@@ -0,0 +1,77 @@
+"""Decoded review previews: a bounded LRU cache plus a background prefetch thread.
+
+Only PIL images live here; the Tk PhotoImage is still created on the main thread.
+"""
+import threading
+from collections import OrderedDict, deque
+
+from PIL import Image
+
+PREVIEW_SIZE = (600, 600)
+
+def decode_preview(path, size=PREVIEW_SIZE):
+    """Decode `path` down to fit `size`. For JPEGs draft() lets libjpeg decode at 1/2-1/8 scale,
+    so a 24MP file never gets fully decoded just to show a 600px preview."""
+    with Image.open(path) as im:
+        im.draft("RGB", size)
+        preview = im.convert("RGB")
+    preview.thumbnail(size)
+    return preview
+
+class PreviewCache:
+    def __init__(self, max_items=32):
+        self.max_items = max_items
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        with self._lock:
+            preview = self._items.get(path)
+            if preview is not None:
+                self._items.move_to_end(path)
+            return preview
+
+    def put(self, path, preview):
+        with self._lock:
+            self._items[path] = preview
+            self._items.move_to_end(path)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def __contains__(self, path):
+        with self._lock:
+            return path in self._items
+
+class Prefetcher:
+    """Decodes requested paths into a PreviewCache on a daemon thread.
+
+    Each request() replaces the previous wish list, so after fast clicking the worker
+    doesn't grind through previews the user has already skipped past.
+    """
+
+    def __init__(self, cache, size=PREVIEW_SIZE):
+        self.cache = cache
+        self.size = size
+        self._wanted = deque()
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="preview-prefetch", daemon=True)
+        self._thread.start()
+
+    def request(self, paths):
+        with self._cond:
+            self._wanted.clear()
+            self._wanted.extend(p for p in paths if p and p not in self.cache)
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._wanted:
+                    self._cond.wait()
+                path = self._wanted.popleft()
+            if path in self.cache:
+                continue
+            try:
+                self.cache.put(path, decode_preview(path, self.size))
+            except Exception:
+                pass  # missing/broken files are reported when the user gets to them
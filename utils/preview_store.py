@@ -0,0 +1,163 @@
+"""Content-addressed previews, written once at ingest so originals aren't decoded again and again.
+
+For each image (keyed on the SHA-256 of its bytes, stored as review_queue.Content_Hash):
+
+    data/previews/ab/<hash>_600.jpg    the review editor's 600px preview
+    data/previews/ab/<hash>_score.jpg  SCORING_SIZE long edge, what dhash is taken from and
+                                       what the scorer measures when it runs with a working
+                                       size (batch_image_quality_score.METRICS_SIZE)
+
+Both come from one JPEG draft decode (libjpeg scales down while decoding) of the original;
+the full 24MP decode is left for the final render. Readers fall back to the original when
+an entry is missing.
+
+The store is kept under BUDGET_MB: every lookup touches the file's mtime, and prune()
+deletes the least recently used files first. No index to keep in sync, so ingest threads,
+scorer processes and the review editor can all use it at once.
+
+    python -m utils.preview_store [--backfill] [--prune] [--budget-mb 2048]
+"""
+import os
+import time
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from utils.score_cache import file_digest
+
+STORE_DIR = os.path.join("data", "previews")
+PREVIEW_SIZE = (600, 600)
+SCORING_SIZE = 1024      # long edge; the largest scorer METRICS_SIZE these copies can stand in for
+PREVIEW_QUALITY = 85
+SCORING_QUALITY = 95
+BUDGET_MB = 2048
+BACKFILL_WORKERS = 8
+KINDS = {"preview": "_600.jpg", "scoring": "_score.jpg"}
+
+def entry_path(digest, kind, root=STORE_DIR):
+    return os.path.join(root, digest[:2], digest + KINDS[kind])
+
+def lookup(digest, kind, root=STORE_DIR):
+    """Path of a stored image (marked as recently used), or None."""
+    if not digest:
+        return None
+    path = entry_path(digest, kind, root)
+    try:
+        os.utime(path)
+    except OSError:
+        return None
+    return path
+
+def _save(image, path, quality):
+    # A temp file of its own: two ingest threads may be storing identical content at once.
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            image.save(f, "JPEG", quality=quality)
+        os.replace(tmp, path)  # readers never see a half-written file
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+def ensure(src, digest=None, root=STORE_DIR):
+    """Write the preview and scoring images for `src` unless they exist. Returns the content hash."""
+    digest = digest or file_digest(src)
+    if lookup(digest, "preview", root) and lookup(digest, "scoring", root):
+        return digest
+    os.makedirs(os.path.dirname(entry_path(digest, "preview", root)), exist_ok=True)
+    with Image.open(src) as im:
+        scale = min(1.0, SCORING_SIZE / max(im.size))
+        size = (max(1, round(im.width * scale)), max(1, round(im.height * scale)))
+        im.draft("RGB", size)
+        image = im.convert("RGB")
+    if image.size != size:
+        image = image.resize(size, Image.BOX)  # area average, like the scorer's INTER_AREA
+    _save(image, entry_path(digest, "scoring", root), SCORING_QUALITY)
+    image.thumbnail(PREVIEW_SIZE)
+    _save(image, entry_path(digest, "preview", root), PREVIEW_QUALITY)
+    return digest
+
+def usage(root=STORE_DIR):
+    """[(mtime, bytes, path)] of every stored file."""
+    files = []
+    if not os.path.isdir(root):
+        return files
+    for sub in os.scandir(root):
+        if sub.is_dir():
+            for entry in os.scandir(sub.path):
+                if entry.name.endswith(".jpg"):
+                    st = entry.stat()
+                    files.append((st.st_mtime, st.st_size, entry.path))
+    return files
+
+def prune(budget_mb=BUDGET_MB, root=STORE_DIR):
+    """Delete least recently used files until the store fits the budget. Returns (files removed, bytes freed)."""
+    files = usage(root)
+    excess = sum(size for _, size, _ in files) - budget_mb * 1024 * 1024
+    removed = freed = 0
+    for _, size, path in sorted(files):
+        if excess <= 0:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        excess -= size
+        removed += 1
+        freed += size
+    return removed, freed
+
+def backfill(db_path, workers=BACKFILL_WORKERS):
+    """Build entries (and Content_Hash) for queued rows ingested before the store existed."""
+    from utils.repository import get_repository, TO_REVIEW
+
+    repo = get_repository(db_path)
+    rows = repo.conn.execute(f"SELECT id, Path, Content_Hash FROM review_queue WHERE {TO_REVIEW}").fetchall()
+
+    def build(row):
+        img_id, path, digest = row
+        try:
+            return img_id, digest, ensure(path, digest), None
+        except Exception as e:
+            return img_id, digest, None, f"{path}: {e}"
+
+    built, failed = 0, []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        with repo.batch():
+            for img_id, old, digest, error in pool.map(build, rows):
+                if error:
+                    failed.append(error)
+                    continue
+                built += 1
+                if digest != old:
+                    repo.update(img_id, {"Content_Hash": digest})
+    return built, failed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or prune the preview store.")
+    parser.add_argument("--backfill", action="store_true", help="build previews for queued rows that have none")
+    parser.add_argument("--prune", action="store_true", help="delete least recently used previews over the budget")
+    parser.add_argument("--budget-mb", type=int, default=BUDGET_MB)
+    parser.add_argument("--db", default="data/review.db")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    if args.backfill:
+        built, failed = backfill(args.db)
+        for error in failed:
+            print(f"❌ {error}")
+        print(f"✅ {built} row(s) have previews, {len(failed)} failed.")
+    if args.prune or not args.backfill:
+        removed, freed = prune(args.budget_mb)
+        total = sum(size for _, size, _ in usage())
+        print(f"✅ Pruned {removed} file(s) ({freed / 1_048_576:.1f} MB); store is {total / 1_048_576:.1f} MB "
+              f"of {args.budget_mb} MB.")
+    print(f"Done in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
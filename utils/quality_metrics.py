@@ -0,0 +1,70 @@
+"""Blur / brightness / contrast from one luma conversion at a bounded working resolution.
+
+The scorer used to convert the full-resolution frame to grey three times (once per
+metric) and run a float64 Laplacian over all 24-45 MP of it. Here the frame is converted
+once, shrunk with INTER_AREA so its long edge is at most WORKING_SIZE, and then:
+
+    brightness, contrast = cv2.meanStdDev(luma)
+    blur                 = variance of cv2.Laplacian(luma)  (float32: exact for 8-bit input)
+
+The Laplacian variance is resolution dependent: the same frame measures sharper at 1024
+px than at full size, so blur_score values are only comparable between rows scored at
+the same working size (it is part of the score cache key). max_side=0 measures at full
+resolution and reproduces the old calculate_* values; that is what the scorer uses
+unless batch_image_quality_score.METRICS_SIZE is set.
+
+Tiled mode splits the Laplacian into a grid x grid raster and uses the sharpest tile, so
+a sharp subject on a bokeh background is not averaged down to "blurry".
+"""
+import cv2
+import numpy as np
+
+WORKING_SIZE = 1024   # long edge in pixels; 0 = full resolution
+TILE_GRID = 4         # tiles per side in tiled mode
+
+def working_luma(rgb, max_side=WORKING_SIZE):
+    gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+    h, w = gray.shape
+    if max_side and max(h, w) > max_side:
+        scale = max_side / max(h, w)
+        gray = cv2.resize(gray, (max(1, round(w * scale)), max(1, round(h * scale))),
+                          interpolation=cv2.INTER_AREA)
+    return gray
+
+def tile_variances(lap, grid=TILE_GRID):
+    """Laplacian variance of each tile, as a grid x grid array (edge rows/columns that
+    don't fill a whole tile are dropped)."""
+    h, w = lap.shape
+    th, tw = h // grid, w // grid
+    tiles = lap[:th * grid, :tw * grid].reshape(grid, th, grid, tw)
+    return tiles.var(axis=(1, 3), dtype=np.float64)
+
+class LumaFrame:
+    """The working-size luma of one frame, shared by the luma metrics (utils/metric_registry.py).
+    meanStdDev and the Laplacian are computed on first use and only once."""
+    __slots__ = ("gray", "tiled", "grid", "_mean_std")
+
+    def __init__(self, rgb, max_side=WORKING_SIZE, tiled=False, grid=TILE_GRID):
+        self.gray = working_luma(rgb, max_side)
+        self.tiled = tiled
+        self.grid = grid
+        self._mean_std = None
+
+    @property
+    def mean_std(self):
+        if self._mean_std is None:
+            mean, std = cv2.meanStdDev(self.gray)
+            self._mean_std = float(mean[0, 0]), float(std[0, 0])
+        return self._mean_std
+
+    def blur(self):
+        lap = cv2.Laplacian(self.gray, cv2.CV_32F)
+        if self.tiled and min(self.gray.shape) >= self.grid * 3:
+            return float(tile_variances(lap, self.grid).max())
+        return float(cv2.meanStdDev(lap)[1][0, 0]) ** 2
+
+def measure(rgb, max_side=WORKING_SIZE, tiled=False, grid=TILE_GRID):
+    """(blur, brightness, contrast) for an RGB uint8 array."""
+    frame = LumaFrame(rgb, max_side, tiled, grid)
+    brightness, contrast = frame.mean_std
+    return frame.blur(), brightness, contrast
@@ -0,0 +1,139 @@
+"""Single-decode renderer for the web / thumbnail / desktop outputs of an approved image.
+
+The source is decoded once (JPEG draft mode lets libjpeg scale down while decoding),
+downscaled to the web size, and the thumbnail is derived from that web image rather
+than from the original. The watermark stamp is rasterised once per (text, font, size,
+opacity, colour, shadow) and reused for every image. Sizes, qualities and the watermark
+all come from config.yaml.
+
+Batch mode (render_batch / `python -m utils.renderer`) spreads a set of images over a
+process pool.
+"""
+import os
+import shutil
+import argparse
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+
+import yaml
+from PIL import Image, ImageDraw, ImageFont
+
+CONFIG_FILE = "config.yaml"
+SHADOW_OFFSET = 2
+RENDER_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+
+@lru_cache(maxsize=4)
+def load_config(path=CONFIG_FILE):
+    with open(path, encoding="utf-8") as f:
+        return yaml.safe_load(f)
+
+@lru_cache(maxsize=16)
+def watermark_stamp(text, font_path, font_size, opacity, color, shadow):
+    """RGBA image of the watermark text (plus drop shadow), rasterised once per settings."""
+    font = ImageFont.truetype(font_path, font_size)
+    left, top, right, bottom = font.getbbox(text)
+    offset = SHADOW_OFFSET if shadow else 0
+    stamp = Image.new("RGBA", (right - left + offset, bottom - top + offset), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(stamp)
+    if shadow:
+        draw.text((offset - left, offset - top), text, font=font, fill=(0, 0, 0, opacity))
+    draw.text((-left, -top), text, font=font, fill=tuple(color) + (opacity,))
+    return stamp
+
+def stamp_for(config):
+    wm = config["watermark"]
+    paths = config["paths"]
+    font_path = os.path.join(paths["fonts_dir"], paths["watermark_font"])
+    return watermark_stamp(wm["text"], font_path, wm["font_size"], wm["opacity"],
+                           tuple(wm["color"]), bool(wm.get("shadow")))
+
+def apply_watermark(image, stamp, margin_percent):
+    """Composite the stamp in the bottom-right corner, inset by the right/bottom margins and
+    kept inside the left/top margins (margin_percent is [left, right, top, bottom])."""
+    left, right, top, bottom = margin_percent
+    w, h = image.size
+    x = w - stamp.width - int(w * right / 100)
+    y = h - stamp.height - int(h * bottom / 100)
+    x = max(x, int(w * left / 100))
+    y = max(y, int(h * top / 100))
+    marked = image.convert("RGBA")
+    marked.alpha_composite(stamp, dest=(max(x, 0), max(y, 0)))
+    return marked.convert("RGB")
+
+def render_outputs(src, web_path, thumb_path, desk_path, config=None):
+    """Render the watermarked web image (also written to desk_path) and the thumbnail.
+
+    `src` may be the same file as `web_path`; it is fully read before anything is written.
+    Returns {"web": (w, h), "thumb": (w, h)}.
+    """
+    config = config or load_config()
+    web_size = (config["resize"]["width"], config["resize"]["height"])
+    thumb_size = (config["thumbnail"]["width"], config["thumbnail"]["height"])
+
+    with Image.open(src) as im:
+        im.draft("RGB", web_size)
+        exif = im.info.get("exif")
+        icc = im.info.get("icc_profile")
+        web = im.convert("RGB")
+    web.thumbnail(web_size, Image.LANCZOS)
+
+    # Pyramid: the thumbnail comes from the already-downscaled web image.
+    thumb = web.copy()
+    thumb.thumbnail(thumb_size, Image.LANCZOS)
+
+    marked = apply_watermark(web, stamp_for(config), config["watermark"]["margin_percent"])
+
+    extra = {}
+    if exif:
+        extra["exif"] = exif
+    if icc:
+        extra["icc_profile"] = icc
+    for p in (web_path, thumb_path, desk_path):
+        os.makedirs(os.path.dirname(p) or ".", exist_ok=True)
+    marked.save(web_path, "JPEG", quality=config["resize"]["quality"], **extra)
+    thumb.save(thumb_path, "JPEG", quality=config["thumbnail"]["quality"], **extra)
+    if os.path.abspath(desk_path) != os.path.abspath(web_path):
+        shutil.copyfile(web_path, desk_path)
+    return {"web": marked.size, "thumb": thumb.size}
+
+def _render_job(job):
+    try:
+        return job, render_outputs(*job), None
+    except Exception as e:
+        return job, None, str(e)
+
+def render_batch(jobs, workers=RENDER_WORKERS):
+    """Render (src, web_path, thumb_path, desk_path) jobs on a process pool.
+    Yields (job, sizes, error) in input order."""
+    if workers < 1:
+        for job in jobs:
+            yield _render_job(job)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(_render_job, jobs, chunksize=4)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render web/thumb/desktop outputs for a set of images.")
+    parser.add_argument("sources", nargs="+", help="source image files")
+    parser.add_argument("--web-dir", required=True)
+    parser.add_argument("--thumb-dir", required=True)
+    parser.add_argument("--desk-dir", required=True)
+    parser.add_argument("--workers", type=int, default=RENDER_WORKERS)
+    args = parser.parse_args(argv)
+
+    jobs = []
+    for src in args.sources:
+        name = os.path.basename(src)
+        jobs.append((src, os.path.join(args.web_dir, name), os.path.join(args.thumb_dir, name),
+                     os.path.join(args.desk_dir, name)))
+    failed = 0
+    for job, sizes, error in render_batch(jobs, args.workers):
+        if error:
+            failed += 1
+            print(f"❌ {job[0]}: {error}")
+        else:
+            print(f"✅ {os.path.basename(job[0])}: web {sizes['web']}, thumb {sizes['thumb']}")
+    print(f"Rendered {len(jobs) - failed}, failed {failed}")
+
+if __name__ == "__main__":
+    main()
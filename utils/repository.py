@@ -0,0 +1,269 @@
+"""Data access for review_queue, shared by ingest, the scorer, the review editor and the uploader.
+
+- One connection per (process, thread, database), opened through db_schema.connect(),
+  so every caller gets the same pragmas and sqlite3 reuses its compiled statements.
+- Rows come back as ReviewRow objects: slotted, so a page or upload batch of thousands
+  costs far less than the same rows as dicts (benchmarks/bench_row_model.py), and they
+  convert themselves to the photos_info parameter tuples the uploader sends.
+- All SQL is built once here from the schema's column list. update() only accepts
+  known columns, so form field names never end up in SQL.
+- `with repo.batch():` groups every write inside it into one transaction (nested
+  batches join the outer one). Writes outside a batch commit on their own.
+"""
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, fields
+from operator import attrgetter
+
+from utils.db_schema import DB_PATH, TABLE_NAME, REVIEW_COLUMNS, connect
+
+COLUMNS = ["id"] + [name for name, _ in REVIEW_COLUMNS]
+WRITABLE = frozenset(COLUMNS[1:])
+STATEMENT_CACHE = 256
+TO_REVIEW = "(Review_Status IS NULL OR Review_Status != 'Uploaded')"
+UNSCORED = "(QR IS NULL OR QC_Status IS NULL)"
+SCORE_FIELDS = ["nima_score", "blur_score", "brightness_score", "contrast_score", "QR", "QC_Status", "Extra_Scores"]
+# photos_info columns (MySQL and the local mirror), in parameter order.
+PHOTO_FIELDS = [
+    "Folder", "File_Name", "Path", "Thumb_Path", "DateTime", "Camera", "Lens_model",
+    "Width", "Height", "Exposure", "Aperture", "ISO", "Focal_length",
+    "Keywords", "Caption", "Location", "QR", "QC_Status", "Original_File_Name",
+]
+
+SELECT_SQL = f"SELECT {', '.join(COLUMNS)} FROM {TABLE_NAME}"
+GET_SQL = f"{SELECT_SQL} WHERE id=?"
+SCORES_SQL = f"SELECT {', '.join(SCORE_FIELDS)} FROM {TABLE_NAME} WHERE id=?"
+SET_SCORES_SQL = (f"UPDATE {TABLE_NAME} SET {', '.join(f'{f}=?' for f in SCORE_FIELDS)}, "
+                  f"Score_State=? WHERE id=?")
+SET_SCORE_STATE_SQL = f"UPDATE {TABLE_NAME} SET Score_State=? WHERE id=?"
+SET_STATUS_SQL = f"UPDATE {TABLE_NAME} SET Review_Status=? WHERE id=?"
+DELETE_SQL = f"DELETE FROM {TABLE_NAME} WHERE id=?"
+
+_photo_values = attrgetter(*PHOTO_FIELDS)
+
+@dataclass(slots=True)
+class ReviewRow:
+    id: int = None
+    Folder: str = None
+    File_Name: str = None
+    Path: str = None
+    Thumb_Path: str = None
+    DateTime: str = None
+    Camera: str = None
+    Lens_model: str = None
+    Width: int = None
+    Height: int = None
+    Exposure: str = None
+    Aperture: str = None
+    ISO: int = None
+    Focal_length: int = None
+    Keywords: str = None
+    Caption: str = None
+    Location: str = None
+    Subject: str = None
+    nima_score: float = None
+    blur_score: float = None
+    brightness_score: float = None
+    contrast_score: float = None
+    QR: float = None
+    QC_Status: str = None
+    Review_Status: str = None
+    Original_File_Name: str = None
+    Score_State: str = None
+    dhash: str = None
+    Dup_Group: str = None
+    Dup_Of: str = None
+    Extra_Scores: str = None
+    Content_Hash: str = None
+
+    def as_dict(self):
+        return {f.name: getattr(self, f.name) for f in fields(self)}
+
+    def update(self, values):
+        """Copy the known columns from a {column: value} mapping; other keys are ignored."""
+        for key, value in values.items():
+            if key in WRITABLE:
+                setattr(self, key, value)
+
+    def to_photo_params(self):
+        """photos_info INSERT parameters (PHOTO_FIELDS order); the integer columns are coerced."""
+        (folder, name, path, thumb, taken, camera, lens, width, height, exposure, aperture,
+         iso, focal, keywords, caption, location, qr, qc, original) = _photo_values(self)
+        return (folder, name, path, thumb, taken, camera, lens, int(width), int(height), exposure,
+                aperture, int(iso), int(focal), keywords, caption, location, qr, qc, original)
+
+    def to_update_params(self):
+        """photos_info metadata UPDATE parameters: the non-key fields, then Folder and File_Name."""
+        params = self.to_photo_params()
+        return params[2:] + params[:2]
+
+assert [f.name for f in fields(ReviewRow)] == COLUMNS, "ReviewRow must match db_schema.REVIEW_COLUMNS"
+
+def _check_columns(columns):
+    unknown = set(columns) - WRITABLE
+    if unknown:
+        raise ValueError(f"Unknown {TABLE_NAME} column(s): {', '.join(sorted(unknown))}")
+
+class Repository:
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self._local = threading.local()
+
+    @property
+    def conn(self):
+        """This thread's connection (opened, configured and migrated on first use)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = connect(self.path, cached_statements=STATEMENT_CACHE)
+            self._local.depth = 0
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    @contextmanager
+    def batch(self):
+        """Commit every write inside the block together (rolled back if it raises)."""
+        conn = self.conn
+        self._local.depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._local.depth -= 1
+            if self._local.depth == 0:
+                conn.rollback()
+            raise
+        self._local.depth -= 1
+        if self._local.depth == 0:
+            conn.commit()
+
+    def _write(self, sql, params_seq):
+        with self.batch():
+            self.conn.executemany(sql, params_seq)
+
+    # --- reads ---
+
+    def select(self, where="1", params=(), order="id", limit=None, cls=ReviewRow):
+        """Rows matching a WHERE clause written by the caller (values go in `params`), as `cls`
+        (ReviewRow or a subclass that adds fields after the columns)."""
+        sql = f"{SELECT_SQL} WHERE {where} ORDER BY {order}"
+        if limit:
+            sql += " LIMIT ?"
+            params = list(params) + [limit]
+        cur = self.conn.cursor()
+        cur.row_factory = lambda _, row: cls(*row)
+        return cur.execute(sql, params).fetchall()
+
+    def get(self, img_id):
+        cur = self.conn.cursor()
+        cur.row_factory = lambda _, row: ReviewRow(*row)
+        return cur.execute(GET_SQL, (img_id,)).fetchone()
+
+    def count(self, where="1", params=()):
+        return self.conn.execute(f"SELECT COUNT(*) FROM {TABLE_NAME} WHERE {where}", params).fetchone()[0]
+
+    def scores(self, img_id):
+        """{score column: value} for one row, or None if it is gone."""
+        row = self.conn.execute(SCORES_SQL, (img_id,)).fetchone()
+        return dict(zip(SCORE_FIELDS, row)) if row else None
+
+    def unscored(self, retry_failed=True, limit=None, rescore_states=()):
+        """(id, Path, Dup_Group, Content_Hash) of rows without scores (or whose Score_State
+        is in `rescore_states`), oldest first."""
+        where = UNSCORED
+        params = list(rescore_states)
+        if rescore_states:
+            where = f"({where} OR Score_State IN ({','.join(['?'] * len(params))}))"
+        if not retry_failed:
+            where += " AND (Score_State IS NULL OR Score_State != 'Failed')"
+        sql = f"SELECT id, Path, Dup_Group, Content_Hash FROM {TABLE_NAME} WHERE {where} ORDER BY id"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        return self.conn.execute(sql, params).fetchall()
+
+    def group_nima(self, groups):
+        """{Dup_Group: (nima_score, QR)} of the best NIMA-scored frame of each group that has one."""
+        found = {}
+        groups = [g for g in set(groups) if g]
+        # SQLite takes the bare QR column from the row MAX() picked.
+        for start in range(0, len(groups), 500):
+            chunk = groups[start:start + 500]
+            marks = ",".join(["?"] * len(chunk))
+            for group, nima, qr in self.conn.execute(
+                    f"SELECT Dup_Group, MAX(nima_score), QR FROM {TABLE_NAME} WHERE Dup_Group IN ({marks}) "
+                    f"AND Score_State = 'Scored' AND nima_score IS NOT NULL GROUP BY Dup_Group", chunk):
+                found[group] = (nima, qr)
+        return found
+
+    def nima_quantile(self, q, min_rows=1):
+        """The q-quantile of nima_score over model-scored rows, or None with fewer than `min_rows` of them."""
+        where = "Score_State = 'Scored' AND nima_score IS NOT NULL"
+        n = self.count(where)
+        if n < max(1, min_rows):
+            return None
+        return self.conn.execute(f"SELECT nima_score FROM {TABLE_NAME} WHERE {where} "
+                                 f"ORDER BY nima_score LIMIT 1 OFFSET ?", (min(n - 1, int(n * q)),)).fetchone()[0]
+
+    def approved(self, cls=ReviewRow):
+        return self.select("Review_Status = 'Approved'", cls=cls)
+
+    # --- writes ---
+
+    def insert_many(self, rows):
+        """Insert {column: value} dicts, one executemany per distinct column set."""
+        by_columns = {}
+        for values in rows:
+            by_columns.setdefault(tuple(values.keys()), []).append(tuple(values.values()))
+        with self.batch():
+            for columns, params in by_columns.items():
+                _check_columns(columns)
+                marks = ", ".join(["?"] * len(columns))
+                self.conn.executemany(f"INSERT INTO {TABLE_NAME} ({', '.join(columns)}) VALUES ({marks})", params)
+
+    def update(self, img_id, values, status=None):
+        """UPDATE the given columns (and Review_Status, if `status` is given) for one row."""
+        values = {k: v for k, v in values.items() if k != "id"}
+        if status is not None:
+            values["Review_Status"] = status
+        if not values:
+            return
+        _check_columns(values)
+        set_clause = ", ".join(f"{k}=?" for k in values)
+        self._write(f"UPDATE {TABLE_NAME} SET {set_clause} WHERE id=?", [list(values.values()) + [img_id]])
+
+    def set_scores(self, updates, state="Scored"):
+        """updates: (nima, blur, brightness, contrast, QR, QC_Status, Extra_Scores, id) tuples;
+        sets Score_State to `state`."""
+        if updates:
+            self._write(SET_SCORES_SQL, [u[:-1] + (state, u[-1]) for u in updates])
+
+    def set_score_state(self, img_ids, state):
+        if img_ids:
+            self._write(SET_SCORE_STATE_SQL, [(state, img_id) for img_id in img_ids])
+
+    def set_status(self, img_ids, status):
+        if img_ids:
+            self._write(SET_STATUS_SQL, [(status, img_id) for img_id in img_ids])
+
+    def delete(self, img_ids):
+        if img_ids:
+            self._write(DELETE_SQL, [(img_id,) for img_id in img_ids])
+
+    def delete_uploaded(self):
+        with self.batch():
+            return self.conn.execute(f"DELETE FROM {TABLE_NAME} WHERE Review_Status = 'Uploaded'").rowcount
+
+_repositories = {}
+_repositories_lock = threading.Lock()
+
+def get_repository(path=DB_PATH):
+    """The process-wide Repository for `path` (its connections are per thread)."""
+    with _repositories_lock:
+        repo = _repositories.get(path)
+        if repo is None:
+            repo = _repositories[path] = Repository(path)
+        return repo
@@ -0,0 +1,123 @@
+"""Keyset-paginated view of review_queue for the review editor.
+
+Only one page of rows (ordered by id) is held in memory; moving past either end of the
+page loads the neighbouring page with `id > last` / `id < first`, so startup cost and
+memory don't grow with the size of the queue. Filters narrow the view to QC_Status
+buckets, a Folder or a QR range. The matching-row count is taken once per filter change
+(rows removed from the view are subtracted), not on every move.
+"""
+
+from utils.repository import TO_REVIEW
+
+PAGE_SIZE = 50
+
+class ReviewQueue:
+    def __init__(self, repo, page_size=PAGE_SIZE, qc_buckets=None, folder=None, qr_min=None, qr_max=None):
+        self.repo = repo
+        self.page_size = page_size
+        self.page = []
+        self.pos = 0
+        self._count = None
+        self.set_filters(qc_buckets, folder, qr_min, qr_max)
+
+    def set_filters(self, qc_buckets=None, folder=None, qr_min=None, qr_max=None, start_id=None):
+        """Apply new filters and move to the first matching row (or the first with id >= start_id)."""
+        self.qc_buckets = list(qc_buckets) if qc_buckets else None
+        self.folder = folder or None
+        self.qr_min = qr_min
+        self.qr_max = qr_max
+        self._count = None
+        self._load_after((start_id - 1) if start_id else 0)
+        self.pos = 0
+
+    def _where(self):
+        clauses, params = [TO_REVIEW], []
+        if self.qc_buckets:
+            clauses.append(f"QC_Status IN ({','.join(['?'] * len(self.qc_buckets))})")
+            params.extend(self.qc_buckets)
+        if self.folder:
+            clauses.append("Folder = ?")
+            params.append(self.folder)
+        if self.qr_min is not None:
+            clauses.append("QR >= ?")
+            params.append(self.qr_min)
+        if self.qr_max is not None:
+            clauses.append("QR <= ?")
+            params.append(self.qr_max)
+        return " AND ".join(clauses), params
+
+    def _query(self, id_clause, id_value, order, limit):
+        where, params = self._where()
+        return self.repo.select(f"{where} AND {id_clause}", params + [id_value], f"id {order}", limit)
+
+    def _load_after(self, last_id):
+        self.page = self._query("id > ?", last_id, "ASC", self.page_size)
+
+    def _fetch_before(self, first_id, limit):
+        return self._query("id < ?", first_id, "DESC", limit)[::-1]
+
+    @property
+    def current(self):
+        return self.page[self.pos] if 0 <= self.pos < len(self.page) else None
+
+    def next(self):
+        """Advance one row; False at the end of the queue (position stays on the last row)."""
+        if self.pos + 1 < len(self.page):
+            self.pos += 1
+            return True
+        if not self.page:
+            return False
+        following = self._query("id > ?", self.page[-1].id, "ASC", self.page_size)
+        if not following:
+            return False
+        self.page, self.pos = following, 0
+        return True
+
+    def prev(self):
+        """Go back one row; False at the start of the queue."""
+        if self.pos > 0:
+            self.pos -= 1
+            return True
+        if not self.page:
+            return False
+        preceding = self._fetch_before(self.page[0].id, self.page_size)
+        if not preceding:
+            return False
+        self.page, self.pos = preceding, len(preceding) - 1
+        return True
+
+    def neighbours(self, ahead, behind):
+        """Rows just after and just before the current one (for prefetching), nearest first."""
+        if not self.page:
+            return [], []
+        after = self.page[self.pos + 1:self.pos + 1 + ahead]
+        if len(after) < ahead:
+            after += self._query("id > ?", self.page[-1].id, "ASC", ahead - len(after))
+        before = self.page[max(0, self.pos - behind):self.pos][::-1]
+        if len(before) < behind:
+            before += self._fetch_before(self.page[0].id, behind - len(before))[::-1]
+        return after, before
+
+    def remove(self, img_id):
+        """Forget a deleted row; next() then moves to the row that followed it."""
+        for i, row in enumerate(self.page):
+            if row.id == img_id:
+                del self.page[i]
+                if self._count:
+                    self._count -= 1
+                if i <= self.pos:
+                    self.pos -= 1
+                break
+        if not self.page:
+            self._load_after(img_id)
+            self.pos = -1
+
+    def find(self, img_id):
+        """The loaded row with this id, if it is on the current page."""
+        return next((row for row in self.page if row.id == img_id), None)
+
+    def count(self):
+        """Rows matching the filters, counted when they were set."""
+        if self._count is None:
+            self._count = self.repo.count(*self._where())
+        return self._count
@@ -0,0 +1,117 @@
+"""Persistent quality-score cache keyed on image content + model version.
+
+Rows that get deleted (reject, init_db/build_table resets) and come back later
+hash to the same key, so the scorer can reuse their metrics instead of
+decoding the file and running NIMA again.
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+
+CACHE_DB = "data/score_cache.db"
+DEFAULT_MAX_ENTRIES = 50000
+COLUMN_METRICS = ("nima", "blur", "brightness", "contrast")
+
+def file_digest(path):
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+class ScoreCache:
+    """Raw metric values per (content hash, model key), evicted LRU-first. nima/blur/brightness/
+    contrast have columns; any other metric (utils/metric_registry.py) is kept as JSON in `extra`."""
+
+    def __init__(self, model_key, path=CACHE_DB, max_entries=DEFAULT_MAX_ENTRIES):
+        self.model_key = model_key
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self.evicted = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        with self.conn:
+            self.conn.execute("""CREATE TABLE IF NOT EXISTS scores (
+                digest TEXT NOT NULL,
+                model TEXT NOT NULL,
+                nima REAL, blur REAL, brightness REAL, contrast REAL,
+                last_used REAL NOT NULL,
+                extra TEXT,
+                PRIMARY KEY (digest, model)
+            )""")
+            if "extra" not in {row[1] for row in self.conn.execute("PRAGMA table_info(scores)")}:
+                self.conn.execute("ALTER TABLE scores ADD COLUMN extra TEXT")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_scores_last_used ON scores (last_used)")
+
+    def get_many(self, digests):
+        """Return {digest: {metric: raw value}} for the digests already cached."""
+        found = {}
+        wanted = [d for d in set(digests) if d]
+        # Stay well under SQLite's bound-parameter limit.
+        for start in range(0, len(wanted), 500):
+            chunk = wanted[start:start + 500]
+            marks = ",".join(["?"] * len(chunk))
+            cur = self.conn.execute(
+                f"SELECT digest, nima, blur, brightness, contrast, extra FROM scores "
+                f"WHERE model=? AND digest IN ({marks})",
+                [self.model_key] + chunk,
+            )
+            for digest, *values, extra in cur:
+                raw = {name: value for name, value in zip(COLUMN_METRICS, values) if value is not None}
+                raw.update(json.loads(extra) if extra else {})
+                found[digest] = raw
+        if found:
+            now = time.time()
+            with self.conn:
+                self.conn.executemany(
+                    "UPDATE scores SET last_used=? WHERE digest=? AND model=?",
+                    [(now, d, self.model_key) for d in found],
+                )
+        self.hits += sum(1 for d in digests if d in found)
+        self.misses += sum(1 for d in digests if d not in found)
+        return found
+
+    def put_many(self, entries):
+        """entries: iterable of (digest, {metric: raw value})."""
+        now = time.time()
+        rows = []
+        for digest, raw in entries:
+            if digest:
+                extra = {name: value for name, value in raw.items() if name not in COLUMN_METRICS}
+                rows.append((digest, self.model_key, *(raw.get(name) for name in COLUMN_METRICS), now,
+                             json.dumps(extra) if extra else None))
+        if not rows:
+            return
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO scores (digest, model, nima, blur, brightness, contrast, last_used, extra) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        self.stored += len(rows)
+
+    def evict(self):
+        """Drop least-recently-used entries beyond max_entries (across all model keys)."""
+        total = self.conn.execute("SELECT COUNT(*) FROM scores").fetchone()[0]
+        excess = total - self.max_entries
+        if excess <= 0:
+            return 0
+        with self.conn:
+            self.conn.execute(
+                "DELETE FROM scores WHERE rowid IN "
+                "(SELECT rowid FROM scores ORDER BY last_used LIMIT ?)",
+                (excess,),
+            )
+        self.evicted += excess
+        return excess
+
+    def summary(self):
+        looked_up = self.hits + self.misses
+        rate = (100.0 * self.hits / looked_up) if looked_up else 0.0
+        return (f"Score cache: {self.hits} hits, {self.misses} misses ({rate:.0f}% hit rate), "
+                f"{self.stored} stored, {self.evicted} evicted")
+
+    def close(self):
+        self.evict()
+        self.conn.close()
@@ -0,0 +1,100 @@
+"""Producer/consumer bridge that scores rows while the rest of the batch is still being ingested.
+
+Ingestion calls rows_inserted() after each committed chunk; a consumer thread scores what
+is pending, in passes of PASS_LIMIT rows so the first scores land quickly. Score_State in
+review_queue tracks Queued/Scored/Failed.
+
+Passes run in this process (InProcessScorer) unless a ScoringWorker is passed in, so the
+long-lived `--serve` process stays opt-in (main.USE_SCORING_WORKER).
+"""
+import queue
+import threading
+import time
+
+from batch_image_quality_score import score_pending, loaded_models, DB_PATH, DEFAULT_BATCH_SIZE
+
+PASS_LIMIT = DEFAULT_BATCH_SIZE * 2
+REVIEW_AFTER_SCORED = 10
+
+class InProcessScorer:
+    """score_pending in this process, behind the same start()/score() calls as ScoringWorker.
+    Models stay loaded for the life of the process."""
+
+    def start(self):
+        pass
+
+    def score(self, **params):
+        started = time.perf_counter()
+        warm = bool(loaded_models())
+        db_path = params.pop("db", DB_PATH)
+        scored, failed = score_pending(db_path=db_path, **params)
+        return {"scored": scored, "failed": failed, "warm": warm,
+                "seconds": round(time.perf_counter() - started, 3)}
+
+class StreamingScorer:
+    def __init__(self, worker=None, review_after=REVIEW_AFTER_SCORED, pass_limit=PASS_LIMIT, db=None):
+        self.worker = worker or InProcessScorer()
+        self.review_after = review_after
+        self.pass_limit = pass_limit
+        self.db = db
+        self.scored = 0
+        self.failed = 0
+        self.error = None
+        self.started = None
+        self.first_review_at = None
+        self.review_ready = threading.Event()
+        self.finished = threading.Event()
+        self._ready = queue.Queue()
+        self._ingestion_done = False
+        self._thread = threading.Thread(target=self._run, name="streaming-scorer", daemon=True)
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+
+    def rows_inserted(self, count):
+        self._ready.put(count)
+
+    def ingestion_done(self):
+        self._ready.put(None)
+
+    def _drain(self, block):
+        try:
+            item = self._ready.get(block=block)
+            while True:
+                if item is None:
+                    self._ingestion_done = True
+                item = self._ready.get_nowait()
+        except queue.Empty:
+            pass
+
+    def _run(self):
+        try:
+            # Starting (and warming) the worker overlaps with the first file moves.
+            self.worker.start()
+            self._drain(block=True)
+            while True:
+                self._drain(block=False)
+                params = {"retry_failed": False, "limit": self.pass_limit}
+                if self.db:
+                    params["db"] = self.db
+                result = self.worker.score(**params)
+                self.scored += result["scored"]
+                self.failed += result["failed"]
+                if not self.review_ready.is_set() and self.scored >= self.review_after:
+                    self._mark_review_ready()
+                if result["scored"] + result["failed"] >= self.pass_limit:
+                    continue  # probably more pending; go again straight away
+                if self._ingestion_done:
+                    break
+                self._drain(block=True)
+        except Exception as e:
+            self.error = e
+        finally:
+            if not self.review_ready.is_set():
+                self._mark_review_ready()
+            self.finished.set()
+
+    def _mark_review_ready(self):
+        self.first_review_at = time.perf_counter() - self.started
+        self.review_ready.set()
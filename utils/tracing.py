@@ -0,0 +1,221 @@
+"""Stage and per-image timing spans for every part of the pipeline, kept in data/trace.db.
+
+    with span("upload.ftp", file=name) as s:
+        s["bytes_out"] = transfer(...)
+    record("score.decode", seconds, file=path, bytes_in=size)   # timed somewhere else
+
+A span is one row: run, stage, file (if it is about one image), start, seconds, items,
+bytes read/written and any other keyword attributes (as JSON). Spans are buffered and
+written in batches (and at exit), so tracing a 40 ms decode costs a list append.
+
+Every process of one run shares the PIPELINE_RUN_ID environment variable: the first one
+to trace sets it, and the scorer subprocesses, the review editor and pool workers started
+from it inherit it. The long-lived scoring worker is told the run id with each request.
+Long-lived callers start a run per unit of work with new_run() (watch_folder: one per
+batch); spans recorded in the background go to whichever run is current at the time.
+
+    python -m pipeline report [--run ID]
+
+summarizes a run: items/s, p50/p95 latency and bytes per stage, and the slowest files.
+Set PIPELINE_TRACE=0 to turn tracing off.
+"""
+import os
+import json
+import time
+import atexit
+import itertools
+import threading
+from contextlib import contextmanager
+
+from utils.db_schema import connect
+
+TRACE_DB = os.path.join("data", "trace.db")
+RUN_ENV = "PIPELINE_RUN_ID"
+ENABLED = os.environ.get("PIPELINE_TRACE", "1") != "0"
+FLUSH_EVERY = 200   # spans buffered before a write
+SLOWEST = 10
+
+_SCHEMA = """CREATE TABLE IF NOT EXISTS spans (
+    run_id TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    file TEXT,
+    started REAL NOT NULL,
+    seconds REAL NOT NULL,
+    items INTEGER NOT NULL DEFAULT 1,
+    bytes_in INTEGER,
+    bytes_out INTEGER,
+    attrs TEXT,
+    pid INTEGER
+)"""
+
+_run_numbers = itertools.count(1)
+
+def _make_run_id():
+    # pid and a per-process counter keep ids unique when runs start within the same second
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(_run_numbers)}"
+
+def run_id():
+    """This run's id, created (and exported to child processes) on first use."""
+    rid = os.environ.get(RUN_ENV)
+    if not rid:
+        rid = os.environ[RUN_ENV] = _make_run_id()
+    return rid
+
+def new_run():
+    """Start a new run for the spans that follow (and child processes started after). Returns its id."""
+    rid = _make_run_id()
+    set_run(rid)
+    return rid
+
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except (OSError, TypeError):
+        return None
+
+def set_run(rid):
+    """Attribute the spans that follow to `rid` (e.g. a request to the long-lived worker)."""
+    if rid:
+        flush()
+        os.environ[RUN_ENV] = rid
+
+_lock = threading.Lock()
+_buffer = []
+_conn = None
+_pid = None
+
+def _connection():
+    global _conn, _pid
+    if _conn is None or _pid != os.getpid():  # forked children open their own
+        _conn = connect(TRACE_DB, migrate_schema=False, check_same_thread=False)
+        with _conn:
+            _conn.execute(_SCHEMA)
+            _conn.execute("CREATE INDEX IF NOT EXISTS idx_spans_run ON spans (run_id, stage)")
+        _pid = os.getpid()
+    return _conn
+
+def record(stage, seconds, file=None, started=None, items=1, bytes_in=None, bytes_out=None, **attrs):
+    """Add a span for work timed elsewhere (`started` is a time.time() value; defaults to now - seconds)."""
+    if not ENABLED:
+        return
+    row = (run_id(), stage, file, started if started is not None else time.time() - seconds,
+           seconds, items, bytes_in, bytes_out, json.dumps(attrs) if attrs else None, os.getpid())
+    with _lock:
+        _buffer.append(row)
+        if len(_buffer) < FLUSH_EVERY:
+            return
+    flush()
+
+@contextmanager
+def span(stage, file=None, items=1, **attrs):
+    """Time the block. Yields a dict: set items/bytes_in/bytes_out or extra attributes on it.
+    Spans that raise are recorded too, with the exception type as `error`."""
+    fields = {"items": items, **attrs}
+    started, clock = time.time(), time.perf_counter()
+    try:
+        yield fields
+    except BaseException as e:
+        fields["error"] = type(e).__name__
+        raise
+    finally:
+        record(stage, time.perf_counter() - clock, file=file, started=started, **fields)
+
+def flush():
+    with _lock:
+        rows = _buffer[:]
+        del _buffer[:]
+        if not rows:
+            return
+        try:
+            conn = _connection()
+            with conn:
+                conn.executemany("INSERT INTO spans VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        except Exception as e:
+            print(f"⚠️ Could not write {len(rows)} trace span(s): {e}")
+
+atexit.register(flush)
+
+# --- Reporting ---
+
+def _percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+def runs(limit=10, path=TRACE_DB):
+    """[(run_id, started, spans)] of the most recent runs, newest first."""
+    flush()
+    if not os.path.exists(path):
+        return []
+    conn = connect(path, migrate_schema=False)
+    try:
+        return conn.execute("SELECT run_id, MIN(started), COUNT(*) FROM spans GROUP BY run_id "
+                            "ORDER BY MIN(started) DESC LIMIT ?", (limit,)).fetchall()
+    finally:
+        conn.close()
+
+def summarize(rid=None, slowest=SLOWEST, path=TRACE_DB):
+    """Per-stage throughput, p50/p95 seconds and bytes for one run (default: the latest),
+    plus its slowest per-file spans. None if nothing was traced."""
+    if rid is None:
+        latest = runs(1, path)
+        if not latest:
+            return None
+        rid = latest[0][0]
+    flush()
+    if not os.path.exists(path):
+        return None
+    conn = connect(path, migrate_schema=False)
+    try:
+        rows = conn.execute("SELECT stage, file, started, seconds, items, bytes_in, bytes_out, attrs "
+                            "FROM spans WHERE run_id = ? ORDER BY started", (rid,)).fetchall()
+    finally:
+        conn.close()
+    if not rows:
+        return None
+
+    stages = {}
+    for stage, file, started, seconds, items, bytes_in, bytes_out, attrs in rows:
+        s = stages.setdefault(stage, {"seconds": [], "items": 0, "bytes_in": 0, "bytes_out": 0,
+                                      "errors": 0, "first": started, "last": started + seconds})
+        s["seconds"].append(seconds)
+        s["items"] += items
+        s["bytes_in"] += bytes_in or 0
+        s["bytes_out"] += bytes_out or 0
+        s["errors"] += bool(attrs and "error" in json.loads(attrs))
+        s["last"] = max(s["last"], started + seconds)
+
+    summary = []
+    for stage, s in stages.items():
+        ordered = sorted(s["seconds"])
+        wall = s["last"] - s["first"]
+        summary.append({
+            "stage": stage, "spans": len(ordered), "items": s["items"],
+            "busy_s": round(sum(ordered), 3), "wall_s": round(wall, 3),
+            "items_per_s": round(s["items"] / wall, 2) if wall > 0 else None,
+            "p50_ms": round(_percentile(ordered, 0.5) * 1000, 1),
+            "p95_ms": round(_percentile(ordered, 0.95) * 1000, 1),
+            "mb_in": round(s["bytes_in"] / 1_048_576, 2), "mb_out": round(s["bytes_out"] / 1_048_576, 2),
+            "errors": s["errors"],
+        })
+    per_file = sorted((r for r in rows if r[1]), key=lambda r: r[3], reverse=True)[:slowest]
+    return {
+        "run_id": rid,
+        "started": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(rows[0][2])),
+        "wall_s": round(max(r[2] + r[3] for r in rows) - rows[0][2], 3),
+        "stages": summary,
+        "slowest": [{"stage": r[0], "file": r[1], "ms": round(r[3] * 1000, 1)} for r in per_file],
+    }
+
+def format_summary(summary):
+    lines = [f"Run {summary['run_id']} started {summary['started']}, {summary['wall_s']:.1f}s wall"]
+    lines.append(f"  {'stage':<18} {'n':>6} {'items/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'MB in':>8} {'MB out':>8}")
+    for s in summary["stages"]:
+        rate = f"{s['items_per_s']:.1f}" if s["items_per_s"] is not None else "-"
+        line = (f"  {s['stage']:<18} {s['spans']:>6} {rate:>8} {s['p50_ms']:>9.1f} {s['p95_ms']:>9.1f} "
+                f"{s['mb_in']:>8.1f} {s['mb_out']:>8.1f}")
+        if s["errors"]:
+            line += f"  ({s['errors']} failed)"
+        lines.append(line)
+    if summary["slowest"]:
+        lines.append("Slowest files:")
+        lines.extend(f"  {s['ms']:9.1f} ms  {s['stage']:<18} {s['file']}" for s in summary["slowest"])
+    return "\n".join(lines)
@@ -0,0 +1,73 @@
+"""Write-ahead journal for db_uploader, so an interrupted publish resumes where it stopped.
+
+Every step of publishing one review_queue row is recorded as `started` before it runs
+and `done` after it succeeds:
+
+    image_stor, thumb_stor  - FTP transfers (detail holds the local size + sha256)
+    remote_row              - MySQL upsert committed
+    mirror_insert           - photos_info mirror upsert committed
+    status_flip             - review_queue row marked Uploaded
+
+A row's entries are cleared once its status flip is committed.
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+
+JOURNAL_DB = "data/upload_journal.db"
+STEPS = ("image_stor", "thumb_stor", "remote_row", "mirror_insert", "status_flip")
+
+class UploadJournal:
+    def __init__(self, path=JOURNAL_DB):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Shared by the FTP threads; every access goes through the lock.
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("""CREATE TABLE IF NOT EXISTS steps (
+                review_id INTEGER NOT NULL,
+                step TEXT NOT NULL,
+                state TEXT NOT NULL,
+                detail TEXT,
+                updated REAL NOT NULL,
+                PRIMARY KEY (review_id, step)
+            )""")
+
+    def _record(self, review_ids, step, state, detail=None):
+        payload = json.dumps(detail) if detail is not None else None
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO steps (review_id, step, state, detail, updated) VALUES (?, ?, ?, ?, ?)",
+                [(rid, step, state, payload, now) for rid in review_ids],
+            )
+
+    def begin(self, review_ids, step, detail=None):
+        self._record(review_ids, step, "started", detail)
+
+    def done(self, review_ids, step, detail=None):
+        self._record(review_ids, step, "done", detail)
+
+    def load(self, review_ids):
+        """Return {review_id: {step: (state, detail)}} for the given rows."""
+        result = {rid: {} for rid in review_ids}
+        ids = list(review_ids)
+        with self.lock:
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                marks = ",".join(["?"] * len(chunk))
+                cur = self.conn.execute(
+                    f"SELECT review_id, step, state, detail FROM steps WHERE review_id IN ({marks})", chunk)
+                for rid, step, state, detail in cur:
+                    result[rid][step] = (state, json.loads(detail) if detail else None)
+        return result
+
+    def clear(self, review_ids):
+        with self.lock, self.conn:
+            self.conn.executemany("DELETE FROM steps WHERE review_id=?", [(rid,) for rid in review_ids])
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,202 @@
+"""Headless ingestion: watch the subfolders of INCOMING_DIR and feed new images through
+ingest + scoring without the Tk picker.
+
+Drop images into INCOMING_DIR/<batch name>/. Subject/Location/Folder for a subfolder come
+from a `batch.json` sidecar inside it, or else from its entry in data/watch_rules.json:
+
+    {"kingfisher-2024": {"subject": "Kingfisher", "location": "Amsterdam", "folder": "Birds"}}
+
+("folder" may be the folder key or its readable name from data/folder_map.json.)
+
+- A file is picked up once its size and mtime have been unchanged for STABLE_SECONDS,
+  so half-copied files are left alone.
+- Stable files are ingested in micro-batches of up to BATCH_MAX per subfolder; a smaller
+  batch goes once its oldest file has waited BATCH_WAIT seconds.
+- Ingest moves the files up into INCOMING_DIR as usual; rows are scored continuously by
+  one StreamingScorer (in this process, models kept loaded) as they land.
+- While more than MAX_QUEUED rows are still waiting for scores, new batches are held back
+  so ingestion can't run away from scoring.
+
+    python watch_folder.py [--once] [--interval 5] [--batch-max 50]
+"""
+import os
+import json
+import time
+import argparse
+
+from utils.ingest import ingest_images, INGEST_WORKERS
+from utils.exif_index import IMAGE_EXTENSIONS
+from utils import tracing
+from utils.repository import get_repository
+from utils.stream_scoring import StreamingScorer
+from batch_image_quality_score import shutdown_pools
+
+DB_PATH = "data/review.db"
+INCOMING_DIR = r"C:\Users\YOUR_USERNAME\incoming"
+RULES_FILE = os.path.join("data", "watch_rules.json")
+FOLDER_MAP_FILE = os.path.join("data", "folder_map.json")
+SIDECAR_NAME = "batch.json"
+POLL_INTERVAL = 5      # seconds between scans
+STABLE_SECONDS = 10    # unchanged size/mtime for this long = finished copying
+BATCH_MAX = 50         # files per micro-batch
+BATCH_WAIT = 30        # seconds a stable file waits for its batch to fill up
+MAX_QUEUED = 200       # rows waiting for scores before new batches are held back
+STREAM_CHUNK = 8
+
+def load_json(path, default):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+
+def batch_rule(subfolder, rules, folder_keys):
+    """(subject, location, folder key) for a subfolder, or None if it has no rule."""
+    rule = load_json(os.path.join(INCOMING_DIR, subfolder, SIDECAR_NAME), None) or rules.get(subfolder)
+    if not rule:
+        return None
+    subj, loc, fld = (str(rule.get(k, "")).strip() for k in ("subject", "location", "folder"))
+    if not (subj and loc and fld):
+        return None
+    return subj, loc, folder_keys.get(fld, fld)
+
+class FolderWatcher:
+    def __init__(self, interval=POLL_INTERVAL, batch_max=BATCH_MAX, max_queued=MAX_QUEUED):
+        self.interval = interval
+        self.batch_max = batch_max
+        self.max_queued = max_queued
+        self.repo = get_repository(DB_PATH)
+        self.streamer = StreamingScorer(review_after=1)
+        self.candidates = {}   # path -> (size, mtime_ns, first seen unchanged)
+        self.stable = {}       # path -> time it became stable
+        self.done = set()      # paths already ingested (or failed) this run
+        self.warned = set()
+        self.ingested = 0
+        self.failed = 0
+
+    def scan(self):
+        """Update debounce state; return {subfolder: [stable paths]}."""
+        now = time.monotonic()
+        seen = set()
+        for entry in os.scandir(INCOMING_DIR):
+            if not entry.is_dir():
+                continue
+            for root, _, files in os.walk(entry.path):
+                for name in files:
+                    path = os.path.join(root, name)
+                    if not name.lower().endswith(IMAGE_EXTENSIONS) or path in self.done:
+                        continue
+                    seen.add(path)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    size, mtime, since = self.candidates.get(path, (None, None, now))
+                    if (size, mtime) != (st.st_size, st.st_mtime_ns):
+                        self.candidates[path] = (st.st_size, st.st_mtime_ns, now)
+                        self.stable.pop(path, None)
+                    elif now - since >= STABLE_SECONDS:
+                        self.stable.setdefault(path, now)
+        for path in set(self.candidates) - seen:
+            self.candidates.pop(path, None)
+            self.stable.pop(path, None)
+
+        groups = {}
+        for path in self.stable:
+            subfolder = os.path.relpath(path, INCOMING_DIR).split(os.sep)[0]
+            groups.setdefault(subfolder, []).append(path)
+        return groups
+
+    def queued(self):
+        return self.repo.count("Score_State = 'Queued'")
+
+    def ready_batches(self, groups, flush_all):
+        now = time.monotonic()
+        for subfolder, paths in sorted(groups.items()):
+            paths.sort(key=lambda p: self.stable[p])
+            while paths:
+                batch = paths[:self.batch_max]
+                full = len(batch) >= self.batch_max
+                waited = now - self.stable[batch[0]] >= BATCH_WAIT
+                if not (full or waited or flush_all):
+                    break
+                yield subfolder, batch
+                paths = paths[len(batch):]
+
+    def ingest(self, subfolder, paths, rule):
+        subj, loc, fld = rule
+        run = tracing.new_run()  # one run per batch, so `pipeline report` shows each on its own
+        started = time.perf_counter()
+        inserted, failures = ingest_images(
+            paths, subj, loc, fld, INCOMING_DIR, DB_PATH, workers=INGEST_WORKERS,
+            chunk_size=STREAM_CHUNK, on_inserted=self.streamer.rows_inserted,
+        )
+        for path in paths:
+            self.done.add(path)
+            self.candidates.pop(path, None)
+            self.stable.pop(path, None)
+        for src, err in failures:
+            print(f"❌ Failed to ingest {src}: {err}")
+        self.ingested += inserted
+        self.failed += len(failures)
+        print(f"[WATCH] {subfolder}: inserted {inserted}/{len(paths)} in {time.perf_counter() - started:.2f}s "
+              f"(scored so far {self.streamer.scored}, failed {self.streamer.failed}; run {run})")
+
+    def poll(self, flush_all=False):
+        """One scan + ingest round. Returns True while some files are still being written."""
+        rules = load_json(RULES_FILE, {})
+        folder_keys = {v: k for k, v in load_json(FOLDER_MAP_FILE, {}).items()}
+        groups = self.scan()
+        for subfolder, batch in self.ready_batches(groups, flush_all):
+            rule = batch_rule(subfolder, rules, folder_keys)
+            if rule is None:
+                if subfolder not in self.warned:
+                    print(f"⚠️ No rule for '{subfolder}' (add {SIDECAR_NAME} or an entry in {RULES_FILE}); skipping.")
+                    self.warned.add(subfolder)
+                continue
+            self.warned.discard(subfolder)
+            # Backpressure: don't pile more rows on a scorer that is behind.
+            while self.queued() > self.max_queued:
+                self.streamer.rows_inserted(0)  # make sure the scorer is working through them
+                if self.streamer.error:
+                    raise RuntimeError(f"Scoring stopped: {self.streamer.error}")
+                print(f"[WATCH] {self.queued()} rows waiting for scores; holding new batches...")
+                time.sleep(self.interval)
+            self.ingest(subfolder, batch, rule)
+        return any(p not in self.stable for p in self.candidates)
+
+    def run(self, once=False):
+        os.makedirs(INCOMING_DIR, exist_ok=True)
+        self.repo.conn  # create/migrate review_queue before anything else touches it
+        self.streamer.start()
+        self.streamer.rows_inserted(0)  # score anything left Queued by an earlier run
+        print(f"[WATCH] Watching subfolders of {INCOMING_DIR} (Ctrl+C to stop)")
+        try:
+            while True:
+                waiting = self.poll(flush_all=once)
+                if once and not waiting:
+                    break
+                time.sleep(self.interval)
+        except KeyboardInterrupt:
+            print("\n[WATCH] Stopping; letting scoring finish what was ingested...")
+        finally:
+            # Also when poll() raises (e.g. the scorer stopped): let the scoring thread finish
+            # and shut the decode pools down before the error propagates.
+            self.streamer.ingestion_done()
+            self.streamer.finished.wait()
+            shutdown_pools()
+        if self.streamer.error:
+            print(f"❌ Streaming scorer failed: {self.streamer.error}")
+        print(f"✅ Ingested {self.ingested} (failed {self.failed}); scored {self.streamer.scored}, "
+              f"scoring failed {self.streamer.failed}.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Watch INCOMING_DIR subfolders and ingest/score new images.")
+    parser.add_argument("--once", action="store_true",
+                        help="ingest whatever is (or becomes) stable now, then exit")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL, help="seconds between scans")
+    parser.add_argument("--batch-max", type=int, default=BATCH_MAX, help="files per micro-batch")
+    parser.add_argument("--max-queued", type=int, default=MAX_QUEUED,
+                        help="hold new batches while more rows than this wait for scores")
+    args = parser.parse_args()
+    FolderWatcher(args.interval, max(1, args.batch_max), args.max_queued).run(once=args.once)